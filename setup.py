@@ -37,8 +37,9 @@ if __name__ == "__main__":
             [pytest11]
             deltabot.pytestplugin=deltabot.pytestplugin
         ''',
-        python_requires='>=3.5',
-        install_requires=['deltachat>=1.40.1', 'py'],
+        python_requires='>=3.7',
+        install_requires=['deltachat>=1.40.1', 'py',
+                          'importlib_metadata; python_version < "3.8"'],
         include_package_data=True,
         zip_safe=False,
     )
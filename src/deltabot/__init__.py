@@ -1,15 +1,27 @@
 # -*- coding: utf-8 -*-
 
 from .hookspec import deltabot_hookimpl  # noqa
-from .bot import DeltaBot  # noqa
 
-from pkg_resources import get_distribution, DistributionNotFound
 try:
-    __version__ = get_distribution(__name__).version
-except DistributionNotFound:
+    from importlib.metadata import version, PackageNotFoundError
+except ImportError:  # python < 3.8
+    from importlib_metadata import version, PackageNotFoundError
+
+try:
+    __version__ = version(__name__)
+except PackageNotFoundError:
     # package is not installed
     __version__ = "0.0.0.dev0-unknown"
 
 
 # for nice access via deltabot.hookimpl
 hookimpl = deltabot_hookimpl
+
+
+def __getattr__(name):
+    # the bot module imports the deltachat bindings which many
+    # command line invocations don't need, so import it on first access
+    if name == "DeltaBot":
+        from .bot import DeltaBot
+        return DeltaBot
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
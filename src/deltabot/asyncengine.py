@@ -0,0 +1,70 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncEngine:
+    """ bot-owned asyncio event loop running in its own thread.
+
+    Coroutines returned from ``async def`` command and filter functions
+    are scheduled on this loop so that many I/O bound handlers can be
+    in flight at the same time without occupying a thread each.
+    Blocking functions can be awaited through :meth:`run_sync` which
+    runs them in a thread pool executor.
+    """
+    def __init__(self, logger, max_executor_workers=None):
+        self.logger = logger
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_executor_workers,
+                                           thread_name_prefix="bot-async-executor")
+        self.loop.set_default_executor(self.executor)
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """ start the event loop thread if it is not running yet. """
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self.logger.info("starting bot-asyncio-loop THREAD")
+            self._thread = t = threading.Thread(target=self._run, name="bot-asyncio-loop")
+            t.setDaemon(1)
+            t.start()
+
+    def stop(self, timeout=10):
+        """ stop the event loop thread, abandoning coroutines still in flight. """
+        with self._start_lock:
+            if not self.is_running():
+                return
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=timeout)
+            self.executor.shutdown(wait=False)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro, name):
+        """ schedule a coroutine on the event loop from any thread.
+
+        Exceptions raised by the coroutine are logged with the given name.
+
+        :returns: a :class:`concurrent.futures.Future` for the coroutine result.
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self._log_errors(coro, name), self.loop)
+
+    async def _log_errors(self, coro, name):
+        try:
+            return await coro
+        except Exception as ex:
+            self.logger.exception("async handler {!r} failed: {}".format(name, ex))
+
+    async def run_sync(self, func, *args, **kwargs):
+        """ await a blocking function call which is run in the executor. """
+        return await self.loop.run_in_executor(
+            None, functools.partial(func, *args, **kwargs))
@@ -0,0 +1,137 @@
+import inspect
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from deltachat import Account, Message
+from deltachat.capi import lib
+
+from .bot import DeltaBot, Replies
+from .plugins import make_plugin_manager
+from .stats import percentile
+
+
+def make_offline_account(basedir, addr="bench@example.org"):
+    """ return an account in basedir which is configured but never goes online. """
+    account = Account(os.path.join(basedir, "account.db"), "deltabot/{}".format(sys.platform))
+    account.set_config("addr", addr)
+    account.set_config("mail_pw", "bench")
+    # the configured_* keys are not settable through the python API
+    lib.dc_set_config(account._dc_context, b"configured_addr", addr.encode("ascii"))
+    lib.dc_set_config(account._dc_context, b"configured_mail_pw", b"bench")
+    lib.dc_set_config(account._dc_context, b"configured", b"1")
+    return account
+
+
+class Benchmark:
+    """ feed synthetic incoming messages through the plugin pipeline of a bot.
+
+    The benchmark runs against a copy of the bot with the same plugins but
+    its own offline account and settings database in a temporary
+    directory, so the bot's own account and settings are not touched.
+    Replies are handed to core like in a serving bot but never leave the
+    offline account.
+    """
+    def __init__(self, bot, args):
+        self.bot = bot
+        self.tmpdir = tempfile.mkdtemp(prefix="deltabot-bench-")
+        self.logger = logging.Logger("deltabot-bench")
+        self.logger.parent = None
+        self.logger.setLevel(logging.WARNING)
+        self.logger.addHandler(logging.StreamHandler())
+
+        account = make_offline_account(self.tmpdir)
+        pm = make_plugin_manager()
+        self.bench_bot = DeltaBot(account, self.logger, plugin_manager=pm, args=args)
+        # carry over plugin modules which were added to the bot on top of
+        # the builtin and setuptools ones, e.g. by "deltabot add-module"
+        for name, plugin in bot.plugins.items():
+            if inspect.ismodule(plugin) and not pm.is_registered(plugin):
+                if pm.get_plugin(name) is None:
+                    self.bench_bot.plugins.add_module(name, plugin)
+        self.bench_bot.plugins.hook.deltabot_start(bot=self.bench_bot)
+        self.bench_bot.async_engine.start()
+
+    def close(self):
+        self.bench_bot.async_engine.stop()
+        self.bench_bot.plugins.hook.deltabot_shutdown(bot=self.bench_bot)
+        self.bench_bot.account.shutdown()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def make_messages(self, count, commands, texts, command_ratio=0.5,
+                      group_ratio=0.3, attachment_ratio=0.1, num_chats=10, seed=0):
+        """ return count incoming messages with a random mix of the given kinds.
+
+        :param commands: command lines, e.g. "/help", to choose commands from.
+        :param texts: texts of non-command messages.
+        :param num_chats: number of different 1:1 and group chats each.
+        """
+        account = self.bench_bot.account
+        rand = random.Random(seed)
+        contacts = [account.create_contact("user{}@example.org".format(i), name="user{}".format(i))
+                    for i in range(num_chats)]
+        single_chats = [account.create_chat(contact) for contact in contacts]
+        group_chats = [account.create_group_chat("benchgroup{}".format(i), contacts=[contact])
+                       for i, contact in enumerate(contacts)]
+        attachment = os.path.join(self.tmpdir, "attachment.bin")
+        with open(attachment, "wb") as f:
+            f.write(os.urandom(16 * 1024))
+
+        messages = []
+        for i in range(count):
+            has_file = rand.random() < attachment_ratio
+            msg = Message.new_empty(account, "file" if has_file else "text")
+            if rand.random() < command_ratio:
+                msg.set_text(rand.choice(commands))
+            else:
+                msg.set_text(rand.choice(texts))
+            if has_file:
+                msg.set_file(attachment)
+            chats = group_chats if rand.random() < group_ratio else single_chats
+            messages.append(rand.choice(chats).prepare_message(msg))
+        return messages
+
+    def run(self, messages):
+        """ process the messages one by one and return the benchmark results. """
+        bot = self.bench_bot
+        latencies = []
+        errors = 0
+        started = time.perf_counter()
+        for message in messages:
+            start = time.perf_counter()
+            try:
+                replies = Replies(message, logger=self.logger)
+                bot.stats.call_hook(
+                    bot.plugins.hook.deltabot_incoming_message,
+                    dict(message=message, bot=bot, replies=replies))
+                # waits for async handlers, like the serving bot does
+                replies.send_reply_messages()
+            except Exception as ex:
+                self.logger.warning("processing message failed: {!r}".format(ex))
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+        elapsed = time.perf_counter() - started
+        return make_results(latencies, elapsed, errors)
+
+
+def make_results(latencies, elapsed, errors=0):
+    """ return a json-serializable dict describing a benchmark run. """
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return dict(
+        messages=count,
+        errors=errors,
+        seconds=elapsed,
+        throughput=count / elapsed if elapsed else 0.0,
+        latency=dict(
+            mean=sum(latencies) / count if count else 0.0,
+            p50=percentile(latencies, 0.5),
+            p95=percentile(latencies, 0.95),
+            p99=percentile(latencies, 0.99),
+            max=latencies[-1] if count else 0.0,
+        ),
+    )
@@ -1,11 +1,13 @@
 # -*- coding: utf-8 -*-
 
+import asyncio
+import math
 import os
 import threading
+import time
 import tempfile
 import shutil
-
-import py
+from queue import Full
 
 import deltachat as dc
 from deltachat import account_hookimpl
@@ -13,29 +15,88 @@ from deltachat import Message, Contact
 from deltachat.tracker import ConfigureTracker
 from deltachat.message import parse_system_add_remove
 
-from .builtin.cmdline import AddModule
-from .commands import Commands
+from .asyncengine import AsyncEngine
+from .commands import Commands, CMD_PREFIX
 from .filters import Filters
 from .plugins import Plugins, get_global_plugin_manager
-
-
-class DeltaBot:
-    def __init__(self, account, logger, plugin_manager=None, args=()):
+from .profiler import Profiler
+from .reloader import get_module_paths, load_module
+from .settings import BotSettings
+from .startup import StartupReport
+from .stats import Stats, get_stats_path
+from .timeouts import HandlerTimeouts
+from .workers import ChatWorkerPool, PriorityWorkerPool
+
+#: chunk size used for streaming bytefile replies into the blob directory
+BLOB_CHUNK_SIZE = 64 * 1024
+
+#: processing priorities of incoming messages, lower values are processed first
+PRIORITY_ADMIN = 0
+PRIORITY_SINGLE = 1
+PRIORITY_GROUP_COMMAND = 2
+PRIORITY_GROUP = 3
+PRIORITY_NAMES = {
+    PRIORITY_ADMIN: "admin",
+    PRIORITY_SINGLE: "single",
+    PRIORITY_GROUP_COMMAND: "group-command",
+    PRIORITY_GROUP: "group",
+}
+
+
+class DeltaBot(BotSettings):
+    def __init__(self, account, logger, plugin_manager=None, args=(), startup_report=None,
+                 async_engine=None, handler_executor=None):
+        """ bot serving the account.
+
+        :param async_engine: :class:`deltabot.asyncengine.AsyncEngine` shared
+                             with other bots.  The bot does not stop it.
+        :param handler_executor: executor for running handlers with a timeout,
+                                 shared with other bots, see
+                                 :class:`deltabot.timeouts.HandlerTimeouts`.
+        """
+        init_start = time.perf_counter()
         # by default we will use the global instance of the
         # plugin_manager.
         if plugin_manager is None:
             plugin_manager = get_global_plugin_manager()
 
+        #: durations of the startup phases of this bot
+        #: see :class:`deltabot.startup.StartupReport`
+        self.startup_report = report = startup_report or StartupReport()
+
         #: Account object for creating contacts/groups etc.
         #: see :class:`deltachat.account.Account`
         self.account = account
 
+        #: directory of the account database and other bot state files
+        self.basedir = os.path.dirname(account.db_path)
+
         self.logger = logger
 
+        #: optional in-memory cache in front of the settings hooks
+        #: see :meth:`enable_settings_cache`
+        self.settings_cache = None
+
+        #: optional limiter for incoming messages per contact and chat,
+        #: see :class:`deltabot.ratelimit.RateLimiter`
+        self.rate_limiter = None
+
         #: plugin subsystem for adding/removing plugins and calling plugin hooks
         #: see :class:`deltabot.plugins.Plugins`
         self.plugins = Plugins(logger=logger, plugin_manager=plugin_manager)
 
+        #: call counts, errors and latencies of hooks, commands and filters
+        #: see :class:`deltabot.stats.Stats`
+        self.stats = Stats()
+
+        #: sampling profiler for message processing
+        #: see :class:`deltabot.profiler.Profiler`
+        self.profiler = Profiler(self)
+
+        #: deadlines of command and filter handlers
+        #: see :class:`deltabot.timeouts.HandlerTimeouts`
+        self.handler_timeouts = HandlerTimeouts(self, executor=handler_executor)
+
         #: commands subsystem for registering/executing commands in incoming messages
         #: see :class:`deltabot.commands.Commands`
         self.commands = Commands(self)
@@ -44,15 +105,27 @@ class DeltaBot:
         #: see :class:`deltabot.filters.Filters`
         self.filters = Filters(self)
 
+        #: asyncio event loop on which ``async def`` commands and filters are run
+        #: see :class:`deltabot.asyncengine.AsyncEngine`
+        self._owns_async_engine = async_engine is None
+        self.async_engine = AsyncEngine(logger=logger) if async_engine is None else async_engine
+
+        # sends out replies, either inline or from sender threads
+        self._sender = ReplySender(self)
+
         # process dc events and turn them into deltabot ones
         self._eventhandler = IncomingEventHandler(self)
+        self._shutdown_triggered = False
 
-        plugin_manager.hook.deltabot_init.call_historic(kwargs=dict(bot=self, args=args))
+        with report.timed_hookimpls(plugin_manager, "deltabot_init_settings"):
+            plugin_manager.hook.deltabot_init_settings.call_historic(
+                kwargs=dict(bot=self, args=args))
+        with report.timed_hookimpls(plugin_manager, "deltabot_init"):
+            plugin_manager.hook.deltabot_init.call_historic(kwargs=dict(bot=self, args=args))
         # add manually added python modules as plugins
-        for pymodule in self.get(AddModule.db_key, "").split("\n"):
-            if pymodule:
-                mod = py.path.local(pymodule).pyimport()
-                self.plugins.add_module(name=os.path.basename(pymodule), module=mod)
+        for path in get_module_paths(self):
+            with report.timed("add-module", os.path.basename(path)):
+                load_module(self, path)
 
         # set some useful bot defaults on the account
         self.account.update_config(dict(
@@ -62,41 +135,16 @@ class DeltaBot:
             mvbox_watch=0,
             bcc_self=0
         ))
+        report.add("DeltaBot.__init__", "", time.perf_counter() - init_start)
 
-    #
-    # API for persistent scoped-key/value settings
-    #
-    def set(self, name, value, scope="global"):
-        """ Store a bot setting with the given scope. """
-        assert "/" not in scope and "/" not in name
-        key = scope + "/" + name
-        self.plugins._pm.hook.deltabot_store_setting(key=key, value=value)
-
-    def delete(self, name, scope="global"):
-        """ Delete a bot setting with the given scope. """
-        assert "/" not in scope
-        key = scope + "/" + name
-        self.plugins._pm.hook.deltabot_store_setting(key=key, value=None)
-
-    def get(self, name, default=None, scope="global"):
-        """ Get a bot setting from the given scope. """
-        assert "/" not in scope
-        key = scope + "/" + name
-        res = self.plugins._pm.hook.deltabot_get_setting(key=key)
-        return res if res is not None else default
-
-    def list_settings(self, scope=None):
-        """ list bot settings for the given scope.
-
-        If scope is not specified, all settings are returned.
+    def is_admin(self, contact):
+        """ Return True if the contact is listed in the "admins" setting.
+
+        The setting holds whitespace separated e-mail addresses, see
+        ``deltabot db_set global/admins ADDR``.
         """
-        assert scope is None or "/" not in scope
-        l = self.plugins._pm.hook.deltabot_list_settings()
-        if scope is not None:
-            scope_prefix = scope + "/"
-            l = [(x[0][len(scope_prefix):], x[1])
-                 for x in l if x[0].startswith(scope_prefix)]
-        return l
+        addr = self.get_contact(contact).addr
+        return addr in self.get("admins", "").split()
 
     #
     # API for getting at and creating contacts and chats
@@ -166,52 +214,203 @@ class DeltaBot:
     #
     # start/wait/shutdown API
     #
-    def start(self):
-        """ Start bot threads and processing messages. """
-        self.plugins.hook.deltabot_start(bot=self)
+    def start(self, workers=0, senders=0, queue_size=1000, worker_pool=None, sender_pool=None):
+        """ Start bot threads and processing messages.
+
+        :param workers: number of worker threads for processing incoming
+                        messages.  Messages of one chat are always processed
+                        in order while different chats are processed in
+                        parallel.  If 0, all messages are processed
+                        serially in the event handler thread.
+        :param senders: number of threads for sending out replies.  If 0,
+                        replies are sent by the thread which processed the
+                        incoming message.
+        :param queue_size: maximum number of incoming messages waiting for
+                           a worker thread.  Further fresh messages are
+                           left in core until there is space again.
+        :param worker_pool: started :class:`deltabot.workers.PriorityWorkerPool`
+                            shared with other bots, used instead of own
+                            worker threads.  The bot does not stop it.
+        :param sender_pool: started :class:`deltabot.workers.ChatWorkerPool`
+                            shared with other bots, used instead of own
+                            sender threads.  The bot does not stop it.
+        """
+        with self.startup_report.timed_hookimpls(self.plugins._pm, "deltabot_start"):
+            self.plugins.hook.deltabot_start(bot=self)
         addr = self.account.get_config("addr")
         self.logger.info("bot listening at: {}".format(addr))
-        self._eventhandler.start()
+        self.async_engine.start()
+        self._sender.start(num_threads=senders, pool=sender_pool)
+        self._eventhandler.start(workers=workers, queue_size=queue_size, pool=worker_pool)
         self.account.start_io()
 
     def wait_shutdown(self):
         """ Wait and block until bot account is shutdown. """
         self.account.wait_shutdown()
         self._eventhandler.stop()
+        if self._owns_async_engine:
+            self.async_engine.stop()
+        self._sender.stop()
+        self.handler_timeouts.shutdown()
 
     def trigger_shutdown(self):
-        """ Trigger a shutdown of the bot. """
+        """ Trigger a shutdown of the bot, only the first call has an effect.
+
+        This calls the ``deltabot_shutdown`` hook, so plugins can save state.
+        """
+        if self._shutdown_triggered:
+            return
+        self._shutdown_triggered = True
         self._eventhandler.stop()
+        if self._owns_async_engine:
+            self.async_engine.stop()
+        self._sender.stop()
+        self.handler_timeouts.shutdown()
         self.plugins.hook.deltabot_shutdown(bot=self)
         self.account.shutdown()
 
 
 class CheckAll:
-    def __init__(self, bot):
+    def __init__(self, bot, pool=None):
         self.bot = bot
+        self.pool = pool
 
     def perform(self):
+        """ process or queue fresh messages in the order of their priority.
+
+        Messages of one chat are processed in their order with the most
+        urgent priority among them, so chats are ordered by priority,
+        not single messages.
+
+        :returns: False if the worker queue was full and some fresh
+                  messages were left for a later check.
+        """
         logger = self.bot.logger
         logger.info("CheckAll perform-loop start")
+        chats = {}
         for message in self.bot.account.get_fresh_messages():
-            try:
-                replies = Replies(message, logger=logger)
-                logger.info("processing incoming fresh message id={}".format(message.id))
-                if message.is_system_message():
-                    self.handle_system_message(message, replies)
-                else:
-                    self.bot.plugins.hook.deltabot_incoming_message(
-                        message=message,
-                        bot=self.bot,
-                        replies=replies
-                    )
-                replies.send_reply_messages()
-            except Exception as ex:
-                logger.exception("processing message={} failed: {}".format(
-                    message.id, ex))
-            logger.info("processing message id={} FINISHED".format(message.id))
-            message.mark_seen()
+            chats.setdefault(message.chat.id, []).append((self.get_priority(message), message))
+        chat_priorities = [(min(priority for priority, message in items), items)
+                           for items in chats.values()]
+        # sorting is stable, so chats of one priority stay in order
+        chat_priorities.sort(key=lambda item: item[0])
+        for chat_priority, items in chat_priorities:
+            for priority, message in items:
+                if self.pool is None:
+                    self.process_message(message)
+                    continue
+                try:
+                    # messages stay fresh until processed so we need to make
+                    # sure not to schedule a message which is still in flight.
+                    # The pool may be shared by several bots, hence the bot in the keys.
+                    self.pool.submit((self.bot, message.chat.id), self.process_queued,
+                                     message, priority, self.bot.stats.start(),
+                                     ident=(self.bot, message.id), priority=chat_priority,
+                                     block=False)
+                except Full:
+                    self.bot.stats.incr("incoming_queue_full")
+                    logger.info("incoming queue full, deferring fresh messages")
+                    return False
         logger.info("CheckAll perform-loop finish")
+        return True
+
+    def get_priority(self, message):
+        """ return the processing priority of a message, see ``PRIORITY_*``. """
+        if self.bot.is_admin(message.get_sender_contact()):
+            return PRIORITY_ADMIN
+        if not message.chat.is_group():
+            return PRIORITY_SINGLE
+        if message.text.startswith(CMD_PREFIX):
+            return PRIORITY_GROUP_COMMAND
+        return PRIORITY_GROUP
+
+    def process_queued(self, message, priority, enqueued):
+        self.bot.stats.record("queue", "incoming:" + PRIORITY_NAMES[priority], enqueued)
+        # a worker may have finished the message after perform() read it
+        # as fresh and before it was submitted, so check it again.
+        message = self.bot.account.get_message_by_id(message.id)
+        if not message.is_in_fresh():
+            self.bot.logger.info("message id={} was already processed".format(message.id))
+            return
+        self.process_message(message)
+
+    def process_message(self, message):
+        with self.bot.profiler.profile_message():
+            self._process_message(message)
+
+    def _process_message(self, message):
+        logger = self.bot.logger
+        stats = self.bot.stats
+        start = stats.start()
+        try:
+            replies = Replies(message, logger=logger)
+            logger.info("processing incoming fresh message id={}".format(message.id))
+            if message.is_system_message():
+                self.handle_system_message(message, replies)
+            elif not self.check_rate_limit(message, replies):
+                return
+            else:
+                self.bot.stats.call_hook(
+                    self.bot.plugins.hook.deltabot_incoming_message,
+                    dict(message=message, bot=self.bot, replies=replies))
+            if replies.has_pending():
+                # async handlers are still running, replies are sent
+                # from the event loop after they all finished.
+                self.bot.async_engine.submit(
+                    self._send_pending_replies(message, replies, start),
+                    name="replies to message id={}".format(message.id))
+                logger.info("processing message id={} continues async".format(message.id))
+                message.mark_seen()
+                return
+            self.bot._sender.submit(replies)
+        except Exception as ex:
+            logger.exception("processing message={} failed: {}".format(
+                message.id, ex))
+            stats.record("message", "processing", start, error=True)
+        else:
+            stats.record("message", "processing", start)
+        stats.incr("messages_processed")
+        logger.info("processing message id={} FINISHED".format(message.id))
+        message.mark_seen()
+
+    async def _send_pending_replies(self, message, replies, start):
+        await asyncio.wait([asyncio.wrap_future(f) for f in replies._pending])
+        await self.bot.async_engine.run_sync(self.bot._sender.submit, replies)
+        self.bot.stats.record("message", "processing", start)
+        self.bot.stats.incr("messages_processed")
+        self.bot.logger.info("processing message id={} FINISHED".format(message.id))
+
+    def check_rate_limit(self, message, replies):
+        """ return True if the message may be processed now.
+
+        Messages exceeding the bot's rate limits are either dropped, left
+        fresh to be processed when the limit allows it again ("delay") or
+        dropped after replying once with a notice ("notice").  Messages of
+        bot admins are never limited.
+        """
+        limiter = self.bot.rate_limiter
+        if limiter is None:
+            return True
+        contact = message.get_sender_contact()
+        if self.bot.is_admin(contact):
+            return True
+        wait, notify = limiter.check(contact.id, message.chat.id)
+        if not wait:
+            return True
+
+        logger = self.bot.logger
+        self.bot.stats.incr("messages_rate_limited")
+        if limiter.action == "delay" and wait <= limiter.max_delay:
+            logger.info("rate limited message id={} delayed by {:.1f}s".format(
+                message.id, wait))
+            self.bot._eventhandler.schedule_check(wait)
+            return False
+        if limiter.action == "notice" and notify:
+            replies.add(text=limiter.notice.format(seconds=int(math.ceil(wait))))
+            self.bot._sender.submit(replies)
+        logger.info("rate limited message id={} dropped".format(message.id))
+        message.mark_seen()
+        return False
 
     def handle_system_message(self, message, replies):
         logger = self.bot.logger
@@ -231,6 +430,9 @@ class CheckAll:
 
 
 class IncomingEventHandler:
+    #: seconds between saving statistics to disk for "deltabot stats"
+    stats_save_interval = 10.0
+
     def __init__(self, bot):
         self.bot = bot
         self.logger = bot.logger
@@ -238,8 +440,20 @@ class IncomingEventHandler:
         self.bot.account.add_account_plugin(self)
         self._needs_check = threading.Event()
         self._running = True
-
-    def start(self):
+        self._pool = None
+        self._owns_pool = False
+        self._stats_saved = (0, time.time())
+        self._timer = None
+        self._timer_at = None
+        self._timer_lock = threading.Lock()
+
+    def start(self, workers=0, queue_size=1000, pool=None):
+        if pool is not None:
+            self._pool = pool
+        elif workers:
+            self._pool = PriorityWorkerPool(workers, logger=self.logger, maxsize=queue_size)
+            self._pool.start()
+            self._owns_pool = True
         self.logger.info("starting bot-event-handler THREAD")
         self._thread = t = threading.Thread(target=self.event_worker, name="bot-event-handler")
         t.setDaemon(1)
@@ -248,14 +462,58 @@ class IncomingEventHandler:
     def stop(self):
         self._running = False
         self._needs_check.set()
+        with self._timer_lock:
+            if self._timer is not None:
+                self._timer.cancel()
         self._thread.join(timeout=10)
+        if self._owns_pool:
+            self._pool.stop()
+        self.save_stats()
+
+    def qsize(self):
+        """ return the number of messages waiting for a worker thread. """
+        return self._pool.qsize() if self._pool is not None else 0
+
+    def queue_capacity(self):
+        """ return the maximum number of messages waiting for a worker thread. """
+        return self._pool.maxsize if self._pool is not None else 0
+
+    def schedule_check(self, delay):
+        """ check for fresh messages again after delay seconds. """
+        now = time.time()
+        check_at = now + delay
+        with self._timer_lock:
+            if self._timer_at is not None and now < self._timer_at <= check_at:
+                # the pending check comes first and reschedules if needed
+                return
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer_at = check_at
+            self._timer = t = threading.Timer(delay, self._needs_check.set)
+            t.setDaemon(1)
+            t.start()
 
     def event_worker(self):
         self.logger.debug("event-worker startup")
         while self._running:
-            self._needs_check.wait()
-            self._needs_check.clear()
-            CheckAll(self.bot).perform()
+            if self._needs_check.wait(timeout=self.stats_save_interval):
+                self._needs_check.clear()
+                if not CheckAll(self.bot, pool=self._pool).perform():
+                    # check again when there is space, messages which
+                    # arrived meanwhile are then sorted in by priority
+                    self._pool.wait_for_space(timeout=1.0)
+                    self._needs_check.set()
+            if time.time() - self._stats_saved[1] >= self.stats_save_interval:
+                self.save_stats()
+
+    def save_stats(self):
+        version = self.bot.stats.version
+        if version != self._stats_saved[0]:
+            try:
+                self.bot.stats.save(get_stats_path(self.bot))
+            except OSError as ex:
+                self.logger.warn("could not save stats: {}".format(ex))
+        self._stats_saved = (version, time.time())
 
     @account_hookimpl
     def ac_incoming_message(self, message):
@@ -267,6 +525,7 @@ class IncomingEventHandler:
             message.id, message.chat.id, message.text[:50]))
 
         # message is now in fresh state, schedule a check
+        self.bot.stats.incr("messages_incoming")
         self._needs_check.set()
 
     @account_hookimpl
@@ -287,18 +546,101 @@ class IncomingEventHandler:
             message.id, message.chat.id))
 
 
+class ReplySender:
+    """ Outbound stage which hands replies over to core for sending.
+
+    Without sender threads replies are sent right away by the thread which
+    submits them.  With sender threads, replies are queued in bounded
+    per-chat ordered queues so that message processing does not wait on
+    core.  Results are reported through the ``deltabot_replies_sent``
+    and ``deltabot_replies_failed`` hooks.
+    """
+    def __init__(self, bot, queue_size=100):
+        self.bot = bot
+        self.logger = bot.logger
+        self.queue_size = queue_size
+        self._pool = None
+        self._owns_pool = False
+
+    def start(self, num_threads, pool=None):
+        if pool is not None:
+            self._pool = pool
+        elif num_threads:
+            self._pool = ChatWorkerPool(num_threads, logger=self.logger,
+                                        name="bot-sender", maxsize=self.queue_size)
+            self._pool.start()
+            self._owns_pool = True
+
+    def stop(self):
+        if self._owns_pool:
+            self._pool.stop()
+            self._owns_pool = False
+        self._pool = None
+
+    def qsize(self):
+        """ return the number of reply batches waiting to be sent. """
+        return self._pool.qsize() if self._pool is not None else 0
+
+    def submit(self, replies):
+        """ send replies, blocking if the outbound queue is full. """
+        if not replies.has_replies():
+            return
+        if self._pool is None:
+            self.send(replies)
+        else:
+            self._pool.submit((self.bot, replies.incoming_message.chat.id), self.send, replies)
+
+    def send(self, replies):
+        incoming_message = replies.incoming_message
+        try:
+            messages = replies.send_reply_messages()
+        except Exception as ex:
+            self.logger.exception("sending replies to message id={} failed: {}".format(
+                incoming_message.id, ex))
+            self.bot.stats.incr("replies_failed", len(replies._replies))
+            self.bot.plugins.hook.deltabot_replies_failed(
+                bot=self.bot, incoming_message=incoming_message, error=ex)
+        else:
+            self.bot.stats.incr("replies_sent", len(messages))
+            self.bot.plugins.hook.deltabot_replies_sent(
+                bot=self.bot, incoming_message=incoming_message, messages=messages)
+
+
 class Replies:
     def __init__(self, message, logger):
         self.incoming_message = message
         self.logger = logger
         self._replies = []
+        self._pending = []
 
     def has_replies(self):
         return bool(self._replies)
 
+    def has_pending(self):
+        """ Return True if async handlers may still add replies. """
+        return any(not f.done() for f in self._pending)
+
+    def add_pending(self, future):
+        """ Add a future of an async handler which may still add replies.
+
+        Replies are only sent after all pending futures are done.
+        """
+        self._pending.append(future)
+
     def add(self, text=None, filename=None, bytefile=None, chat=None):
-        """ Add a text or file-based reply. """
-        if bytefile:
+        """ Add a text or file-based reply.
+
+        :param text: text of the reply message.
+        :param filename: path of a file to attach.  Files which already live
+                         in the account's blob directory are not copied by core.
+        :param bytefile: binary file-like object, bytes or memoryview with
+                         the file content. It is streamed in chunks into the
+                         blob directory, filename must then be a basename
+                         suggestion.
+        :param chat: chat to send the reply to, defaults to the chat of the
+                     incoming message.
+        """
+        if bytefile is not None:
             if not filename:
                 raise ValueError("missing filename suggestion, needed with bytefile")
             if os.path.basename(filename) != filename:
@@ -306,27 +648,43 @@ class Replies:
 
         self._replies.append((text, filename, bytefile, chat))
 
+    def extend(self, replies):
+        """ Add the replies and pending futures of another Replies object. """
+        self._replies.extend(replies._replies)
+        self._pending.extend(replies._pending)
+
     def send_reply_messages(self):
-        tempdir = tempfile.mkdtemp() if any(x[2] for x in self._replies) else None
+        for future in self._pending:
+            future.result()
+        self._pending[:] = []
         l = []
-        try:
-            for msg in self._send_replies_to_core(tempdir):
-                self.logger.info("reply id={} chat={} sent with text: {!r}".format(
-                                 msg.id, msg.chat, msg.text[:50]))
-                l.append(msg)
-        finally:
-            if tempdir:
-                shutil.rmtree(tempdir)
+        for msg in self._send_replies_to_core():
+            self.logger.info("reply id={} chat={} sent with text: {!r}".format(
+                             msg.id, msg.chat, msg.text[:50]))
+            l.append(msg)
         return l
 
-    def _send_replies_to_core(self, tempdir):
+    def _write_blob(self, filename, bytefile):
+        # core uses files inside the blobdir as they are, so this is the only copy
+        blobdir = self.incoming_message.account.get_blobdir()
+        base, ext = os.path.splitext(filename)
+        fd, path = tempfile.mkstemp(prefix=base + "-", suffix=ext, dir=blobdir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if isinstance(bytefile, (bytes, bytearray, memoryview)):
+                    f.write(bytefile)
+                else:
+                    shutil.copyfileobj(bytefile, f, BLOB_CHUNK_SIZE)
+        except Exception:
+            os.remove(path)
+            raise
+        return path
+
+    def _send_replies_to_core(self):
         for text, filename, bytefile, chat in self._replies:
-            if bytefile:
-                # XXX avoid double copy -- core will copy this file another time
-                # XXX maybe also avoid loading the file into RAM but it's max 50MB
-                filename = os.path.join(tempdir, filename)
-                with open(filename, "wb") as f:
-                    f.write(bytefile.read())
+            blob_path = None
+            if bytefile is not None:
+                filename = blob_path = self._write_blob(filename, bytefile)
 
             if filename:
                 view_type = "file"
@@ -339,7 +697,12 @@ class Replies:
                 msg.set_file(filename)
             if chat is None:
                 chat = self.incoming_message.chat
-            msg = chat.send_msg(msg)
+            try:
+                msg = chat.send_msg(msg)
+            except Exception:
+                if blob_path is not None:
+                    os.remove(blob_path)
+                raise
             yield msg
 
         self._replies[:] = []
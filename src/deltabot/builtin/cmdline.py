@@ -1,4 +1,5 @@
 
+import json
 import os
 
 from deltabot.hookspec import deltabot_hookimpl
@@ -12,6 +13,9 @@ def deltabot_init_parser(parser):
     parser.add_subcommand(Info)
     parser.add_subcommand(ListPlugins)
     parser.add_subcommand(Serve)
+    parser.add_subcommand(ServeMany)
+    parser.add_subcommand(Supervise)
+    parser.add_subcommand(Bench)
     parser.add_subcommand(AddModule)
     parser.add_subcommand(DelModule)
 
@@ -26,6 +30,10 @@ def deltabot_init_parser(parser):
         default=basedir_default,
         help="directory for storing all deltabot state")
     parser.add_generic_option("--show-ffi", action="store_true", help="show low level ffi events")
+    parser.add_generic_option(
+        "--metrics-port", type=int, default=0, metavar="PORT",
+        help="let 'serve' expose prometheus metrics at http://localhost:PORT/metrics",
+        inipath="metrics:port")
 
 
 @deltabot_hookimpl
@@ -67,10 +75,19 @@ class Info:
 class ListPlugins:
     """list deltabot plugins. """
     name = "list-plugins"
+    settings_only = True
 
     def run(self, bot, args, out):
+        from deltabot.reloader import get_module_paths
+
+        plugins = bot.plugins.dict()
         for name, plugin in bot.plugins.items():
             out.line("{:25s}: {}".format(name, plugin))
+        # modules added with "add-module" are only imported by a full bot
+        for path in get_module_paths(bot):
+            name = os.path.basename(path)
+            if name not in plugins:
+                out.line("{:25s}: {}".format(name, path))
 
 
 class AddModule:
@@ -82,6 +99,7 @@ class AddModule:
     """
     name = "add-module"
     db_key = "module-plugins"
+    settings_only = True
 
     def add_arguments(self, parser):
         parser.add_argument("pymodule", type=str, nargs="+")
@@ -125,9 +143,286 @@ class DelModule(AddModule):
 class Serve:
     """serve and react to incoming messages"""
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=0, metavar="N",
+            help="process messages of different chats in parallel with N worker threads "
+                 "(default: process all messages serially)")
+        parser.add_argument(
+            "--queue-size", type=int, default=1000, metavar="N",
+            help="with --workers, queue at most N incoming messages by priority, "
+                 "further ones wait in core (default: %(default)s)")
+        parser.add_argument(
+            "--senders", type=int, default=0, metavar="N",
+            help="send replies from N sender threads instead of the processing thread")
+        parser.add_argument(
+            "--reload", action="store_true",
+            help="reload modules added with 'add-module' when their files change")
+        parser.add_argument(
+            "--reload-interval", type=float, default=1.0, metavar="SECONDS",
+            help="with --reload, check for changed modules every SECONDS")
+        parser.add_argument(
+            "--startup-report", action="store_true",
+            help="print how long loading, initializing and starting each plugin took")
+        parser.add_argument(
+            "--profile", action="store_true",
+            help="sample message processing and write profiles to the basedir on shutdown")
+        parser.add_argument(
+            "--profile-every", type=int, default=1, metavar="N",
+            help="with --profile, only profile every Nth message")
+        parser.add_argument(
+            "--profile-seconds", type=float, default=None, metavar="SECONDS",
+            help="with --profile, stop profiling and write profiles after SECONDS")
+
     def run(self, bot, args, out):
         if not bot.is_configured():
             out.fail("account not configured: {}".format(bot.account.db_path))
+        self.check_args(args, out)
+
+        metrics_server = None
+        if args.metrics_port:
+            from deltabot.metrics import MetricsServer
+            metrics_server = MetricsServer(bot, port=args.metrics_port)
+            metrics_server.start()
+
+        if args.profile:
+            bot.profiler.start(every=args.profile_every, duration=args.profile_seconds)
+
+        bot.start(workers=args.workers, senders=args.senders, queue_size=args.queue_size)
+
+        reloader = None
+        if args.reload:
+            from deltabot.reloader import ModuleReloader
+            reloader = ModuleReloader(bot, interval=args.reload_interval)
+            reloader.start()
+
+        if args.startup_report:
+            for line in bot.startup_report.format_lines():
+                out.line(line)
+        try:
+            bot.account.wait_shutdown()
+        finally:
+            if reloader is not None:
+                reloader.stop()
+            if metrics_server is not None:
+                metrics_server.stop()
+            # lets plugins save state, e.g. persistent rate limits
+            bot.trigger_shutdown()
+            for path in bot.profiler.stop():
+                out.line("wrote profile: {}".format(path))
+
+    def check_args(self, args, out):
+        if args.workers < 0 or args.senders < 0:
+            out.fail("number of workers and senders must not be negative")
+        if args.queue_size < 1:
+            out.fail("--queue-size must be at least 1")
+        if args.profile_every < 1:
+            out.fail("--profile-every must be at least 1")
+        if args.reload_interval <= 0:
+            out.fail("--reload-interval must be positive")
+
+
+class ServeMany(Serve):
+    """serve several bot accounts from one process.
+
+    Every bot needs its own basedir with an account configured through
+    "deltabot --basedir DIR init".  Plugins are imported only once and
+    worker, sender, async and handler timeout threads are shared by all
+    bots, while every bot keeps its own plugin registrations, settings,
+    event handler thread and deltachat core threads.  Generic options
+    apply to all bots.
+    """
+    name = "serve-many"
+    settings_only = True
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "basedirs", nargs="*", metavar="BASEDIR",
+            help="basedirs of the bots to serve")
+        parser.add_argument(
+            "--accounts-dir", metavar="DIR",
+            help="serve every bot in a subdirectory of DIR")
+        super().add_arguments(parser)
+
+    def run(self, bot, args, out):
+        from deltabot.multi import BotGroup, find_basedirs
+
+        self.check_args(args, out)
+        if args.metrics_port:
+            out.fail("--metrics-port is only supported by 'serve'")
+        basedirs = [os.path.abspath(os.path.expanduser(x)) for x in args.basedirs]
+        if args.accounts_dir:
+            basedirs.extend(find_basedirs(os.path.expanduser(args.accounts_dir)))
+        if not basedirs:
+            out.fail("no bot basedirs given")
+
+        group = BotGroup(basedirs, args, logger=bot.logger)
+        for member in group.bots:
+            if not member.is_configured():
+                out.fail("account not configured: {}".format(member.account.db_path))
+            if args.profile:
+                member.profiler.start(every=args.profile_every, duration=args.profile_seconds)
+
+        group.start(workers=args.workers, senders=args.senders, queue_size=args.queue_size)
+
+        reloaders = []
+        if args.reload:
+            from deltabot.reloader import ModuleReloader
+            for member in group.bots:
+                reloader = ModuleReloader(member, interval=args.reload_interval)
+                reloader.start()
+                reloaders.append(reloader)
+
+        if args.startup_report:
+            for member in group.bots:
+                out.line("{}:".format(member.basedir))
+                for line in member.startup_report.format_lines():
+                    out.line(line)
+        try:
+            group.wait_shutdown()
+        finally:
+            for reloader in reloaders:
+                reloader.stop()
+            for member in group.bots:
+                member.trigger_shutdown()
+                for path in member.profiler.stop():
+                    out.line("wrote profile: {}".format(path))
+
+
+class Supervise:
+    """serve bot accounts sharded across several worker processes.
+
+    Every worker process serves its share of the bots like "serve-many",
+    so CPU heavy plugins can use all cores.  Crashed workers are
+    restarted and the health of the workers and the summed counters of
+    all bots are logged and written to "supervisor.json" in the basedir.
+    """
+    settings_only = True
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "basedirs", nargs="*", metavar="BASEDIR",
+            help="basedirs of the bots to serve")
+        parser.add_argument(
+            "--accounts-dir", metavar="DIR",
+            help="serve every bot in a subdirectory of DIR")
+        parser.add_argument(
+            "--processes", type=int, default=os.cpu_count() or 1, metavar="N",
+            help="number of worker processes (default: number of CPUs)")
+        parser.add_argument(
+            "--workers", type=int, default=0, metavar="N",
+            help="worker threads for processing messages in each worker process")
+        parser.add_argument(
+            "--queue-size", type=int, default=1000, metavar="N",
+            help="with --workers, queue at most N incoming messages per worker process")
+        parser.add_argument(
+            "--senders", type=int, default=0, metavar="N",
+            help="sender threads for replies in each worker process")
+        parser.add_argument(
+            "--status-interval", type=float, default=30.0, metavar="SECONDS",
+            help="log and save the status of all bots every SECONDS")
 
-        bot.start()
-        bot.account.wait_shutdown()
+    def run(self, bot, args, out):
+        import signal
+        from deltabot.multi import find_basedirs
+        from deltabot.supervisor import Supervisor
+
+        if args.processes < 1:
+            out.fail("--processes must be at least 1")
+        if args.workers < 0 or args.senders < 0:
+            out.fail("number of workers and senders must not be negative")
+        if args.queue_size < 1:
+            out.fail("--queue-size must be at least 1")
+        if args.status_interval <= 0:
+            out.fail("--status-interval must be positive")
+        basedirs = [os.path.abspath(os.path.expanduser(x)) for x in args.basedirs]
+        if args.accounts_dir:
+            basedirs.extend(find_basedirs(os.path.expanduser(args.accounts_dir)))
+        if not basedirs:
+            out.fail("no bot basedirs given")
+
+        supervisor = Supervisor(basedirs, args, logger=bot.logger,
+                                num_processes=args.processes)
+        signal.signal(signal.SIGTERM, lambda signum, frame: supervisor.stop())
+        try:
+            supervisor.run(status_interval=args.status_interval,
+                           status_path=os.path.join(bot.basedir, "supervisor.json"))
+        except KeyboardInterrupt:
+            pass
+
+
+class Bench:
+    """benchmark message processing with synthetic incoming messages.
+
+    Messages are processed by the bot's plugins, commands and filters
+    using a temporary offline account, nothing is sent out and the bot's
+    own account and settings are not touched.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-n", "--messages", type=int, default=1000, metavar="N",
+            help="number of messages to process (default: %(default)s)")
+        parser.add_argument(
+            "--warmup", type=int, default=20, metavar="N",
+            help="number of messages processed before measuring (default: %(default)s)")
+        parser.add_argument(
+            "--command", action="append", dest="commands", metavar="TEXT",
+            help="command line to send, may be given multiple times (default: /help)")
+        parser.add_argument(
+            "--text", action="append", dest="texts", metavar="TEXT",
+            help="text of non-command messages, may be given multiple times")
+        parser.add_argument(
+            "--command-ratio", type=float, default=0.5, metavar="RATIO",
+            help="fraction of messages which are commands (default: %(default)s)")
+        parser.add_argument(
+            "--group-ratio", type=float, default=0.3, metavar="RATIO",
+            help="fraction of messages in group chats (default: %(default)s)")
+        parser.add_argument(
+            "--attachment-ratio", type=float, default=0.1, metavar="RATIO",
+            help="fraction of messages with a file attachment (default: %(default)s)")
+        parser.add_argument(
+            "--chats", type=int, default=10, metavar="N",
+            help="number of different 1:1 and group chats each (default: %(default)s)")
+        parser.add_argument(
+            "--seed", type=int, default=0, help="random seed for the message mix")
+        parser.add_argument(
+            "--json", action="store_true", help="print results as json")
+
+    def run(self, bot, args, out):
+        from deltabot.bench import Benchmark
+        from deltabot.stats import format_duration
+
+        if args.messages < 1 or args.warmup < 0 or args.chats < 1:
+            out.fail("number of messages and chats must be positive")
+        for ratio in (args.command_ratio, args.group_ratio, args.attachment_ratio):
+            if not 0.0 <= ratio <= 1.0:
+                out.fail("ratios must be between 0 and 1")
+
+        config = dict(
+            messages=args.messages, warmup=args.warmup,
+            commands=args.commands or ["/help"], texts=args.texts or ["hello bot"],
+            command_ratio=args.command_ratio, group_ratio=args.group_ratio,
+            attachment_ratio=args.attachment_ratio, chats=args.chats, seed=args.seed,
+        )
+        benchmark = Benchmark(bot, args)
+        try:
+            messages = benchmark.make_messages(
+                args.warmup + args.messages, config["commands"], config["texts"],
+                command_ratio=args.command_ratio, group_ratio=args.group_ratio,
+                attachment_ratio=args.attachment_ratio, num_chats=args.chats, seed=args.seed)
+            benchmark.run(messages[:args.warmup])
+            results = benchmark.run(messages[args.warmup:])
+        finally:
+            benchmark.close()
+
+        if args.json:
+            results["config"] = config
+            out.line(json.dumps(results, indent=2, sort_keys=True))
+            return
+        latency = results["latency"]
+        out.line("processed {} messages in {:.2f}s ({} errors)".format(
+            results["messages"], results["seconds"], results["errors"]))
+        out.line("throughput: {:.1f} messages/s".format(results["throughput"]))
+        out.line("latency: mean={} p50={} p95={} p99={} max={}".format(
+            *[format_duration(latency[key]) for key in ("mean", "p50", "p95", "p99", "max")]))
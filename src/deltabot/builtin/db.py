@@ -1,34 +1,84 @@
-
 import os
 import sqlite3
+import threading
 from deltabot.hookspec import deltabot_hookimpl
 
 
-@deltabot_hookimpl(tryfirst=True)
-def deltabot_init(bot):
-    db_path = os.path.join(os.path.dirname(bot.account.db_path), "bot.db")
+#: stay below sqlite's limit of host parameters in a single statement
+MAX_SQL_PARAMS = 500
+
+
+@deltabot_hookimpl
+def deltabot_init_settings(bot):
+    db_path = os.path.join(bot.basedir, "bot.db")
     bot.plugins.add_module("db", DBManager(db_path))
 
 
 class DBManager:
+    """ sqlite storage for bot settings.
+
+    The database runs in WAL mode and every thread uses its own connection,
+    so readers don't block each other or the writer.  sqlite only allows a
+    single writer at a time, therefore all writes are serialized through
+    ``write_lock`` instead of failing with "database is locked" errors.
+    """
+
+    #: pragmas applied to every new connection
+    pragmas = (
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA cache_size=-8000",
+        "PRAGMA temp_store=MEMORY",
+    )
+
     def __init__(self, db_path):
-        self.db = sqlite3.connect(db_path, check_same_thread=False)
-        self.db.row_factory = sqlite3.Row
-        self._execute('''CREATE TABLE IF NOT EXISTS config
+        self.db_path = db_path
+        self.write_lock = threading.RLock()
+        self._local = threading.local()
+        self._connections = {}
+        self._connections_lock = threading.Lock()
+        conn = self._get_connection()
+        # WAL mode is persistent and only needs to be set once per database
+        conn.execute("PRAGMA journal_mode=WAL")
+        self._write('''CREATE TABLE IF NOT EXISTS config
                         (keyname TEXT PRIMARY KEY,
                          value TEXT)''')
 
+    def _get_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # check_same_thread=False allows closing connections at shutdown
+            conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                                   cached_statements=256, timeout=30)
+            conn.row_factory = sqlite3.Row
+            for pragma in self.pragmas:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._close_dead_thread_connections()
+                self._connections[threading.current_thread()] = conn
+        return conn
+
+    def _close_dead_thread_connections(self):
+        for thread in list(self._connections):
+            if not thread.is_alive():
+                self._connections.pop(thread).close()
+
     def _execute(self, statement, args=()):
-        with self.db:
-            return self.db.execute(statement, args)
+        return self._get_connection().execute(statement, args)
+
+    def _write(self, statement, args=()):
+        conn = self._get_connection()
+        with self.write_lock, conn:
+            return conn.execute(statement, args)
 
     @deltabot_hookimpl
     def deltabot_store_setting(self, key, value):
-        old_val = self.deltabot_get_setting(key)
-        if value is not None:
-            self._execute('REPLACE INTO config VALUES (?,?)', (key, value))
-        else:
-            self._execute('DELETE FROM config WHERE keyname=?', (key, ))
+        with self.write_lock:
+            old_val = self.deltabot_get_setting(key)
+            if value is not None:
+                self._write('REPLACE INTO config VALUES (?,?)', (key, value))
+            else:
+                self._write('DELETE FROM config WHERE keyname=?', (key, ))
         return old_val
 
     @deltabot_hookimpl
@@ -40,13 +90,58 @@ class DBManager:
         return row['value'] if row else None
 
     @deltabot_hookimpl
-    def deltabot_list_settings(self):
-        rows = self._execute('SELECT * FROM config').fetchall()
-        return [(row['keyname'], row["value"]) for row in rows]
+    def deltabot_store_settings(self, items):
+        replace, delete = [], []
+        for key, value in items:
+            if value is not None:
+                replace.append((key, value))
+            else:
+                delete.append((key, ))
+        conn = self._get_connection()
+        with self.write_lock, conn:
+            conn.executemany('REPLACE INTO config VALUES (?,?)', replace)
+            conn.executemany('DELETE FROM config WHERE keyname=?', delete)
+        return True
+
+    @deltabot_hookimpl
+    def deltabot_get_settings(self, keys):
+        res = {}
+        for i in range(0, len(keys), MAX_SQL_PARAMS):
+            chunk = keys[i:i + MAX_SQL_PARAMS]
+            cursor = self._execute(
+                'SELECT keyname, value FROM config WHERE keyname IN ({})'.format(
+                    ",".join("?" * len(chunk))),
+                chunk,
+            )
+            res.update(self._iter_rows(cursor))
+        return res
+
+    @deltabot_hookimpl
+    def deltabot_list_settings(self, scope):
+        if scope is None:
+            cursor = self._execute('SELECT keyname, value FROM config')
+        else:
+            # range query on the primary key index: '0' is the character after '/'
+            cursor = self._execute(
+                'SELECT keyname, value FROM config WHERE keyname >= ? AND keyname < ?',
+                (scope + "/", scope + "0"),
+            )
+        return self._iter_rows(cursor)
+
+    def _iter_rows(self, cursor, chunksize=500):
+        while 1:
+            rows = cursor.fetchmany(chunksize)
+            if not rows:
+                break
+            for row in rows:
+                yield row[0], row[1]
 
     @deltabot_hookimpl
     def deltabot_shutdown(self, bot):
-        self.db.close()
+        with self._connections_lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
 
 
 class TestDB:
@@ -68,3 +163,43 @@ class TestDB:
         assert l[0][1] == "world"
         assert l[1][0] == "other/hello"
         assert l[1][1] == "xxx"
+
+    def test_wal_and_thread_connections(self, tmpdir):
+        db = DBManager(tmpdir.join("bot.db").strpath)
+        mode = db._execute("PRAGMA journal_mode").fetchone()[0]
+        assert mode == "wal"
+        db.deltabot_store_setting("global/a", "1")
+
+        l = []
+
+        def read():
+            l.append((db._get_connection(), db.deltabot_get_setting("global/a")))
+
+        t = threading.Thread(target=read)
+        t.start()
+        t.join()
+        assert l[0][1] == "1"
+        assert l[0][0] is not db._get_connection()
+        db.deltabot_shutdown(bot=None)
+
+    def test_bulk_settings(self, tmpdir):
+        db = DBManager(tmpdir.join("bot.db").strpath)
+        items = [("s/{}".format(i), str(i)) for i in range(1200)]
+        assert db.deltabot_store_settings(items=items)
+        keys = [key for key, value in items] + ["s/unknown"]
+        assert db.deltabot_get_settings(keys=keys) == dict(items)
+        db.deltabot_store_settings(items=[("s/0", None), ("s/1", "x")])
+        assert db.deltabot_get_settings(keys=["s/0", "s/1"]) == {"s/1": "x"}
+
+    def test_list_scoped_uses_index(self, tmpdir):
+        db = DBManager(tmpdir.join("bot.db").strpath)
+        for scope in ("a", "a.b", "a0", "b"):
+            db.deltabot_store_setting(scope + "/key", scope)
+        db.deltabot_store_setting("a/key2", "a")
+        assert list(db.deltabot_list_settings(scope="a")) == [("a/key", "a"), ("a/key2", "a")]
+        assert len(list(db.deltabot_list_settings(scope=None))) == 5
+
+        plan = db._execute(
+            "EXPLAIN QUERY PLAN SELECT keyname, value FROM config "
+            "WHERE keyname >= ? AND keyname < ?", ("a/", "a0")).fetchall()
+        assert "INDEX" in " ".join(str(row[-1]) for row in plan)
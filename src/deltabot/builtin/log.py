@@ -1,6 +1,9 @@
 
+import atexit
 import os
 import logging.handlers
+from queue import Queue
+
 from deltabot import deltabot_hookimpl
 
 
@@ -10,15 +13,28 @@ def deltabot_init_parser(parser):
         "--stdlog", choices=["info", "debug", "err", "warn"],
         default="info", help="stdout logging level.",
         inipath="log:stdlog")
+    parser.add_generic_option(
+        "--logmode", choices=["direct", "queue"],
+        default="direct",
+        help="'queue' formats and writes log records in a background thread "
+             "instead of the logging thread.",
+        inipath="log:mode")
 
 
 @deltabot_hookimpl
 def deltabot_get_logger(args):
     loglevel = getattr(logging, args.stdlog.upper())
-    return make_logger(args.basedir, loglevel)
+    return make_logger(args.basedir, loglevel, queued=args.logmode == "queue")
+
+
+@deltabot_hookimpl
+def deltabot_shutdown(bot):
+    listener = getattr(bot.logger, "queue_listener", None)
+    if listener is not None:
+        listener.stop()
 
 
-def make_logger(logdir, stdout_loglevel):
+def make_logger(logdir, stdout_loglevel, queued=False):
     logger = logging.Logger('deltabot')
     logger.parent = None
     formatter = logging.Formatter(
@@ -27,18 +43,43 @@ def make_logger(logdir, stdout_loglevel):
     chandler = logging.StreamHandler()
     chandler.setLevel(stdout_loglevel)
     chandler.setFormatter(formatter)
-    logger.addHandler(chandler)
 
     log_path = os.path.join(logdir, "deltabot.log")
     fhandler = logging.handlers.RotatingFileHandler(
         log_path, backupCount=5, maxBytes=2000000)
     fhandler.setLevel(logging.DEBUG)
     fhandler.setFormatter(formatter)
-    logger.addHandler(fhandler)
+
+    if queued:
+        queue = Queue()
+        logger.queue_listener = listener = QueueListener(
+            queue, chandler, fhandler, respect_handler_level=True)
+        listener.start()
+        # write out queued records when the process exits without a bot shutdown
+        atexit.register(listener.stop)
+        logger.addHandler(DeferredQueueHandler(queue))
+    else:
+        logger.addHandler(chandler)
+        logger.addHandler(fhandler)
 
     return logger
 
 
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """ QueueHandler which leaves formatting of records to the listener thread. """
+
+    def prepare(self, record):
+        return record
+
+
+class QueueListener(logging.handlers.QueueListener):
+    """ QueueListener which can be stopped more than once. """
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
 def test_logger_loglevel(capfd, tmpdir):
     logger = make_logger(tmpdir.strpath, stdout_loglevel=logging.INFO)
     logger.info("hello")
@@ -46,3 +87,17 @@ def test_logger_loglevel(capfd, tmpdir):
     out, err = capfd.readouterr()
     assert "hello" in err
     assert "world" not in err
+
+
+def test_logger_queued(capfd, tmpdir):
+    logger = make_logger(tmpdir.strpath, stdout_loglevel=logging.INFO, queued=True)
+    logger.info("hello %s", "queue")
+    logger.debug("world")
+    logger.queue_listener.stop()
+    logger.queue_listener.stop()
+    out, err = capfd.readouterr()
+    assert "hello queue" in err
+    assert "world" not in err
+    content = tmpdir.join("deltabot.log").read()
+    assert "hello queue" in content
+    assert "world" in content
@@ -0,0 +1,76 @@
+from deltabot.hookspec import deltabot_hookimpl
+from deltabot.ratelimit import RateLimiter, parse_rate
+
+#: settings scope for storing rate limiter state between restarts
+SCOPE = "ratelimit"
+
+
+@deltabot_hookimpl
+def deltabot_init_parser(parser):
+    parser.add_generic_option(
+        "--contact-rate-limit", type=parse_rate, default=None, metavar="COUNT/SECONDS",
+        help="process at most COUNT messages of a contact per SECONDS, "
+             "allowing bursts of up to COUNT messages (default: no limit).",
+        inipath="ratelimit:contact")
+    parser.add_generic_option(
+        "--chat-rate-limit", type=parse_rate, default=None, metavar="COUNT/SECONDS",
+        help="process at most COUNT messages of a chat per SECONDS (default: no limit).",
+        inipath="ratelimit:chat")
+    parser.add_generic_option(
+        "--rate-limit-action", choices=["drop", "delay", "notice"], default="notice",
+        help="what to do with messages over the rate limit: 'drop' them, 'delay' "
+             "processing or drop them after replying once with a 'notice'.",
+        inipath="ratelimit:action")
+    parser.add_generic_option(
+        "--rate-limit-store", choices=["memory", "settings"], default="memory",
+        help="'settings' keeps the rate limits of senders over bot restarts.",
+        inipath="ratelimit:store")
+
+
+@deltabot_hookimpl
+def deltabot_init(bot, args):
+    if args.contact_rate_limit or args.chat_rate_limit:
+        bot.rate_limiter = RateLimiter(
+            contact_limit=args.contact_rate_limit,
+            chat_limit=args.chat_rate_limit,
+            action=args.rate_limit_action,
+            persistent=args.rate_limit_store == "settings")
+
+
+@deltabot_hookimpl
+def deltabot_start(bot):
+    limiter = bot.rate_limiter
+    if limiter is not None and limiter.persistent:
+        items = list(bot.iter_settings(scope=SCOPE))
+        limiter.load(items)
+        bot.delete_many([name for name, value in items], scope=SCOPE)
+
+
+# run before the settings database is closed
+@deltabot_hookimpl(tryfirst=True)
+def deltabot_shutdown(bot):
+    limiter = bot.rate_limiter
+    if limiter is not None and limiter.persistent:
+        bot.set_many(limiter.dump(), scope=SCOPE)
+
+
+class TestRateLimit:
+    def test_parse_rate(self):
+        import pytest
+        assert parse_rate("10/60") == (10, 60.0)
+        assert parse_rate("3") == (3, 1.0)
+        for spec in ("x/1", "0/1", "1/0", "1/-1"):
+            with pytest.raises(ValueError):
+                parse_rate(spec)
+
+    def test_persist(self, mock_bot):
+        mock_bot.rate_limiter = limiter = RateLimiter(contact_limit=(2, 60), persistent=True)
+        assert limiter.check(1, 10) == (0.0, False)
+        deltabot_shutdown(bot=mock_bot)
+        assert mock_bot.get("contact-1", scope=SCOPE)
+
+        mock_bot.rate_limiter = limiter = RateLimiter(contact_limit=(2, 60), persistent=True)
+        deltabot_start(bot=mock_bot)
+        assert not mock_bot.list_settings(scope=SCOPE)
+        assert limiter.check(1, 10)[0] == 0.0
+        assert limiter.check(1, 10)[0] > 0
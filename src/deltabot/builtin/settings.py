@@ -9,10 +9,24 @@ def deltabot_init_parser(parser):
     parser.add_subcommand(db_del)
     parser.add_subcommand(db_list)
 
+    parser.add_generic_option(
+        "--settings-cache", type=int, default=0, metavar="N",
+        help="keep up to N bot settings in an in-memory cache (default: no cache). "
+             "A running bot does not see settings changed by other processes then.",
+        inipath="settings:cache")
+
 
 @deltabot_hookimpl
-def deltabot_init(bot):
+def deltabot_init(bot, args):
     bot.commands.register(name="/set", func=command_set)
+    if args.settings_cache:
+        bot.enable_settings_cache(args.settings_cache)
+
+
+@deltabot_hookimpl
+def deltabot_start(bot):
+    if bot.settings_cache is not None:
+        bot.preload_settings_cache()
 
 
 def slash_scoped_key(key):
@@ -24,6 +38,7 @@ def slash_scoped_key(key):
 
 class db_get:
     """Get a low level setting."""
+    settings_only = True
 
     def add_arguments(self, parser):
         parser.add_argument("key", type=slash_scoped_key, help="low level database key")
@@ -39,6 +54,7 @@ class db_get:
 
 class db_del:
     """Delete a low level setting."""
+    settings_only = True
 
     def add_arguments(self, parser):
         parser.add_argument("key", type=slash_scoped_key, help="low level database key")
@@ -55,6 +71,7 @@ class db_del:
 
 class db_set:
     """Set a low level setting."""
+    settings_only = True
 
     def add_arguments(self, parser):
         parser.add_argument("key", type=slash_scoped_key, help="low level database key")
@@ -67,6 +84,7 @@ class db_set:
 
 class db_list:
     """List all key,values. """
+    settings_only = True
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -74,8 +92,7 @@ class db_list:
             help="slash-terminated scope of db key", default=None)
 
     def run(self, bot, args, out):
-        res = bot.list_settings(args.scope)
-        for key, res in res:
+        for key, res in bot.iter_settings(args.scope):
             if "\n" in res:
                 out.line("{}:".format(key))
                 for line in res.split("\n"):
@@ -115,7 +132,7 @@ def command_set(command, replies):
 
 def dump_settings(bot, scope):
     lines = []
-    for name, value in bot.list_settings(scope=scope):
+    for name, value in bot.iter_settings(scope=scope):
         lines.append("{}={}".format(name, value))
     if not lines:
         lines.append("no settings")
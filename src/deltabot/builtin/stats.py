@@ -0,0 +1,104 @@
+
+from deltabot.hookspec import deltabot_hookimpl
+from deltabot.stats import format_snapshot, get_stats_path, load_snapshot
+
+
+@deltabot_hookimpl
+def deltabot_init_parser(parser):
+    parser.add_subcommand(Stats)
+
+
+@deltabot_hookimpl
+def deltabot_init(bot):
+    bot.commands.register(name="/stats", func=command_stats)
+    bot.commands.register(name="/profile", func=command_profile)
+
+
+class Stats:
+    """show call counts, errors and latencies of hooks, commands and filters.
+
+    The statistics are periodically saved by a serving bot.
+    """
+    settings_only = True
+
+    def run(self, bot, args, out):
+        path = get_stats_path(bot)
+        snapshot = load_snapshot(path)
+        if snapshot is None:
+            out.fail("no statistics found at {}, is the bot serving?".format(path))
+        for line in format_snapshot(snapshot):
+            out.line(line)
+
+
+def command_stats(command, replies):
+    """show call counts, errors and latencies of the bot's handlers.
+
+    Only available to addresses listed in the "admins" setting.
+    """
+    if not command.bot.is_admin(command.message.get_sender_contact()):
+        replies.add(text="/stats is only available to bot admins")
+        return
+    snapshot = command.bot.stats.snapshot()
+    replies.add(text="\n".join(format_snapshot(snapshot)))
+
+
+def command_profile(command, replies):
+    """start or stop sampling the bot's message processing.
+
+    Only available to addresses listed in the "admins" setting.
+    Profiles are written into the bot's base directory.
+
+    Examples:
+
+    # profile all messages of the next 60 seconds
+    /profile start 60
+
+    # profile every 10th message until stopped
+    /profile every 10
+
+    # stop profiling and write profiles
+    /profile stop
+    """
+    bot = command.bot
+    if not bot.is_admin(command.message.get_sender_contact()):
+        replies.add(text="/profile is only available to bot admins")
+        return
+    args = command.args
+    try:
+        if args[:1] == ["start"] and len(args) <= 2:
+            bot.profiler.start(duration=float(args[1]) if len(args) == 2 else None)
+            text = "profiling started"
+        elif args[:1] == ["every"] and len(args) == 2 and int(args[1]) > 0:
+            bot.profiler.start(every=int(args[1]))
+            text = "profiling every {} message(s) started".format(args[1])
+        elif args == ["stop"]:
+            paths = bot.profiler.stop()
+            text = "\n".join(["wrote profile:"] + paths) if paths else "profiler not running"
+        else:
+            text = "usage: /profile start [SECONDS] | every N | stop"
+    except ValueError as ex:
+        text = str(ex)
+    replies.add(text=text)
+
+
+class TestCommandStats:
+    def test_not_admin(self, mocker):
+        reply_msg = mocker.run_command("/stats")
+        assert "only available to bot admins" in reply_msg.text
+
+    def test_admin(self, mocker):
+        mocker.bot.set("admins", "alice@example.org")
+        mocker.run_command("/help")
+        reply_msg = mocker.run_command("/stats")
+        assert "command /help: calls=1 errors=0" in reply_msg.text
+
+    def test_profile(self, mocker):
+        mocker.bot.set("admins", "alice@example.org")
+        reply_msg = mocker.run_command("/profile start")
+        assert "started" in reply_msg.text
+        reply_msg = mocker.run_command("/profile start")
+        assert "already running" in reply_msg.text
+        reply_msg = mocker.run_command("/profile stop")
+        assert ".collapsed" in reply_msg.text
+        reply_msg = mocker.run_command("/profile stop")
+        assert "not running" in reply_msg.text
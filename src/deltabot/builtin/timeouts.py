@@ -0,0 +1,63 @@
+from deltabot.hookspec import deltabot_hookimpl
+from deltabot.timeouts import HandlerTimeouts
+
+
+@deltabot_hookimpl
+def deltabot_init_parser(parser):
+    parser.add_generic_option(
+        "--handler-timeout", type=float, default=None, metavar="SECONDS",
+        help="abandon synchronous command and filter handlers running longer than "
+             "SECONDS to a background thread and cancel async ones (default: no timeout).",
+        inipath="handlers:timeout")
+    parser.add_generic_option(
+        "--timeout-reply", default=HandlerTimeouts.still_working, metavar="TEXT",
+        help="reply sent when a handler exceeds its timeout and continues "
+             "in the background.",
+        inipath="handlers:timeout_reply")
+
+
+@deltabot_hookimpl
+def deltabot_init(bot, args):
+    timeouts = bot.handler_timeouts
+    timeouts.default = args.handler_timeout
+    timeouts.still_working = args.timeout_reply
+
+
+class TestHandlerTimeouts:
+    def test_slow_command_continues_in_background(self, mocker, monkeypatch):
+        import threading
+        bot = mocker.bot
+        release = threading.Event()
+        late = []
+        monkeypatch.setattr(bot._sender, "submit", late.append)
+
+        def command_slow(command, replies):
+            """ slow command. """
+            release.wait(10)
+            replies.add(text="done")
+
+        bot.commands.register(name="/slow", func=command_slow, timeout=0.01)
+        reply = mocker.run_command("/slow")
+        assert reply.text == HandlerTimeouts.still_working
+        assert bot.stats.snapshot()["counters"]["handlers_timed_out"] == 1
+
+        release.set()
+        bot.handler_timeouts.shutdown()
+        for _ in range(100):
+            if late:
+                break
+            release.wait(0.05)
+        assert [r[0] for r in late[0]._replies] == ["done"]
+
+    def test_slow_async_command_cancelled(self, mocker):
+        import asyncio
+        bot = mocker.bot
+
+        async def command_slow(command, replies):
+            """ slow async command. """
+            await asyncio.sleep(10)
+            replies.add(text="done")
+
+        bot.commands.register(name="/slow", func=command_slow, timeout=0.01)
+        reply = mocker.run_command("/slow")
+        assert reply.text == HandlerTimeouts.cancelled
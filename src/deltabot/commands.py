@@ -4,6 +4,8 @@ from collections import OrderedDict
 
 
 from . import deltabot_hookimpl
+from .plugins import is_plugin_function
+from .timeouts import HandlerTimeout
 
 
 CMD_PREFIX = '/'
@@ -18,33 +20,38 @@ class Commands:
         self.bot = bot
         self.logger = bot.logger
         self._cmd_defs = OrderedDict()
+        self._cmd_index = CommandIndex()
         self.bot.plugins.add_module("commands", self)
 
-    def register(self, name, func):
+    def register(self, name, func, timeout=None):
         """ register a command function that acts on each incoming non-system message.
 
         :param name: name of the command, example "/test"
         :param func: function that needs to accept 'command' and 'replies' arguments,
                      namely a :class:`deltabot.command.IncomingCommand`
                      and a :class:`deltabot.bot.Replies` object.
+                     If func is an ``async def`` function it is awaited on the
+                     bot's event loop and its replies are sent when it finished.
+        :param timeout: seconds after which the command is abandoned or
+                        cancelled, see :class:`deltabot.timeouts.HandlerTimeouts`.
+                        Defaults to the bot's ``--handler-timeout``.
         """
         short, long = parse_command_docstring(func, args=["command", "replies"])
-        for cand_name in iter_underscore_subparts(name):
-            if cand_name in self._cmd_defs:
-                raise ValueError("command {!r} fails to register, conflicts with: {!r}".format(
-                                 name, cand_name))
-        for reg_name in self._cmd_defs:
-            if reg_name.startswith(name + "_"):
-                raise ValueError("command {!r} fails to register, conflicts with: {!r}".format(
-                                 name, reg_name))
-
-        cmd_def = CommandDef(name, short=short, long=long, func=func)
+        conflict = self._cmd_index.find_conflict(name)
+        if conflict is not None:
+            raise ValueError("command {!r} fails to register, conflicts with: {!r}".format(
+                             name, conflict.cmd))
+
+        cmd_def = CommandDef(name, short=short, long=long, func=func, timeout=timeout)
+        self._cmd_index.add(cmd_def)
         self._cmd_defs[name] = cmd_def
         self.logger.debug("registered new command {!r}".format(name))
 
     def unregister(self, name):
         """ unregister a command function by name. """
-        return self._cmd_defs.pop(name)
+        cmd_def = self._cmd_defs.pop(name)
+        self._cmd_index.remove(name)
+        return cmd_def
 
     def dict(self):
         return self._cmd_defs.copy()
@@ -53,35 +60,45 @@ class Commands:
     def deltabot_incoming_message(self, message, replies):
         if not message.text.startswith(CMD_PREFIX):
             return None
-        args = message.text.split()
-        payload = message.text.split(maxsplit=1)[1] if len(args) > 1 else ""
-        orig_cmd_name = args.pop(0)
-
-        parts = orig_cmd_name.split("_")
-        while parts:
-            cmd_name = "_".join(parts)
-            cmd_def = self._cmd_defs.get(cmd_name)
-            if cmd_def is not None:
-                break
-            newarg = parts.pop()
-            args.insert(0, newarg)
-            payload = (newarg + " " + payload).rstrip()
-        else:
+        parts = message.text.split(maxsplit=1)
+        orig_cmd_name = parts[0]
+        payload = parts[1] if len(parts) > 1 else ""
+
+        cmd_def, subargs = self._cmd_index.lookup(orig_cmd_name)
+        if cmd_def is None:
             reply = "unknown command {!r}".format(orig_cmd_name)
             self.logger.warn(reply)
             if not message.chat.is_group():
                 replies.add(text=reply)
             return True
 
+        args = subargs + payload.split()
+        if subargs:
+            payload = (" ".join(subargs) + " " + payload).rstrip()
+
         cmd = IncomingCommand(bot=self.bot, cmd_def=cmd_def, message=message,
                               args=args, payload=payload)
         self.bot.logger.info("processing command {}".format(cmd))
+        stats = self.bot.stats
+        timeouts = self.bot.handler_timeouts
+        start = stats.start()
         try:
-            res = cmd.cmd_def.func(command=cmd, replies=replies)
+            res = timeouts.call(cmd_def.func, dict(command=cmd), replies, cmd_def.timeout,
+                                "command", cmd_def.cmd, start)
+        except HandlerTimeout:
+            # statistics are recorded when the command finishes
+            pass
         except Exception as ex:
+            stats.record("command", cmd_def.cmd, start, error=True)
             self.logger.exception(ex)
         else:
-            assert res is None, res
+            if inspect.isawaitable(res):
+                res = timeouts.run_async(res, replies, cmd_def.timeout, "command", cmd_def.cmd)
+                res = stats.record_async("command", cmd_def.cmd, start, res)
+                replies.add_pending(self.bot.async_engine.submit(res, name=cmd_def.cmd))
+            else:
+                stats.record("command", cmd_def.cmd, start)
+                assert res is None, res
         return True
 
     @deltabot_hookimpl
@@ -89,6 +106,12 @@ class Commands:
         assert bot == self.bot
         self.register("/help", self.command_help)
 
+    @deltabot_hookimpl
+    def deltabot_plugin_removed(self, plugin):
+        for name, cmd_def in list(self._cmd_defs.items()):
+            if is_plugin_function(cmd_def.func, plugin):
+                self.unregister(name)
+
     def command_help(self, command, replies):
         """ reply with help message about available commands. """
         l = []
@@ -102,15 +125,85 @@ class Commands:
         replies.add(text="\n".join(l))
 
 
+class CommandIndex:
+    """ Prefix tree over the underscore separated parts of command names.
+
+    A command "/join" also handles "/join_123 x" with "123" as first
+    argument, which is why no registered command name may be an
+    underscore prefix of another one.  Registration, removal and lookup
+    only walk the parts of the given name and do not depend on the number
+    of registered commands.
+    """
+    def __init__(self):
+        self._root = _IndexNode()
+
+    def find_conflict(self, name):
+        """ return the CommandDef conflicting with a new command name or None. """
+        node = self._root
+        for part in name.split("_"):
+            node = node.children.get(part)
+            if node is None:
+                return None
+            if node.cmd_def is not None:
+                return node.cmd_def
+        # a longer command with name as underscore prefix is registered
+        while node.cmd_def is None:
+            node = next(iter(node.children.values()))
+        return node.cmd_def
+
+    def add(self, cmd_def):
+        node = self._root
+        for part in cmd_def.cmd.split("_"):
+            node = node.children.setdefault(part, _IndexNode())
+        node.cmd_def = cmd_def
+
+    def remove(self, name):
+        path = [self._root]
+        parts = name.split("_")
+        for part in parts:
+            path.append(path[-1].children[part])
+        path[-1].cmd_def = None
+        # prune nodes which don't lead to any command anymore
+        for part, parent, node in reversed(list(zip(parts, path, path[1:]))):
+            if node.children or node.cmd_def is not None:
+                break
+            del parent.children[part]
+
+    def lookup(self, cmd_name):
+        """ return (CommandDef, subargs) for a command name or (None, None).
+
+        subargs are the underscore separated parts of cmd_name which follow
+        the name of the matching command.
+        """
+        node = self._root
+        parts = cmd_name.split("_")
+        for i, part in enumerate(parts):
+            node = node.children.get(part)
+            if node is None:
+                break
+            if node.cmd_def is not None:
+                return node.cmd_def, parts[i + 1:]
+        return None, None
+
+
+class _IndexNode:
+    __slots__ = ("children", "cmd_def")
+
+    def __init__(self):
+        self.children = {}
+        self.cmd_def = None
+
+
 class CommandDef:
     """ Definition of a '/COMMAND' with args. """
-    def __init__(self, cmd, short, long, func):
+    def __init__(self, cmd, short, long, func, timeout=None):
         if cmd[0] != CMD_PREFIX:
             raise ValueError("cmd {!r} must start with {!r}".format(cmd, CMD_PREFIX))
         self.cmd = cmd
         self.long = long
         self.short = short
         self.func = func
+        self.timeout = timeout
 
     def __eq__(self, c):
         return c.__dict__ == self.__dict__
@@ -141,10 +234,3 @@ def parse_command_docstring(func, args):
 
     lines = description.strip().split("\n")
     return lines.pop(0), "\n".join(lines).strip()
-
-
-def iter_underscore_subparts(name):
-    parts = name.split("_")
-    while parts:
-        yield "_".join(parts)
-        parts.pop()
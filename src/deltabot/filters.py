@@ -1,8 +1,14 @@
 
+import inspect
+import re
 from collections import OrderedDict
 
+from deltachat.message import get_viewtype_code_from_name
+
 from . import deltabot_hookimpl
 from .commands import parse_command_docstring
+from .plugins import is_plugin_function
+from .timeouts import HandlerTimeout
 
 
 class Filters:
@@ -10,39 +16,217 @@ class Filters:
         self.bot = bot
         self.logger = bot.logger
         self._filter_defs = OrderedDict()
+        self._index = None
         self.bot.plugins.add_module("filters", self)
 
-    def register(self, name, func):
-        """ register a filter function that acts on each incoming non-system message. """
+    def register(self, name, func, priority=0, chat_type=None, has_file=None, view_type=None,
+                 regex=None, senders=None, timeout=None):
+        """ register a filter function that acts on each incoming non-system message.
+
+        Filters are called by descending priority and in registration order
+        for the same priority.  If a filter returns True, the message is
+        handled and no further filters are called.
+        The optional preconditions restrict the messages the filter is called for.
+
+        :param name: name of the filter.
+        :param func: function that needs to accept 'message' and 'replies' arguments.
+                     If func is an ``async def`` function it is awaited on the
+                     bot's event loop and its replies are sent when it finished.
+                     The result of ``async def`` functions can not stop the
+                     following filters.
+        :param priority: filters with higher priority are called first.
+        :param chat_type: "single" or "group" to only act on messages of 1:1 or
+                          group chats.
+        :param has_file: True or False to only act on messages with or without
+                         an attached file.
+        :param view_type: view type name like "image" or a list of them to
+                          only act on messages of these view types.
+        :param regex: pattern string or compiled regular expression which
+                      must be found in the message text.
+        :param senders: e-mail address or list of addresses of the contacts
+                        whose messages to act on.
+        :param timeout: seconds after which the filter is abandoned or
+                        cancelled, see :class:`deltabot.timeouts.HandlerTimeouts`.
+                        Defaults to the bot's ``--handler-timeout``.
+        """
         short, long = parse_command_docstring(func, args=["message", "replies"])
-        cmd_def = FilterDef(name, short=short, long=long, func=func)
+        cmd_def = FilterDef(name, short=short, long=long, func=func, priority=priority,
+                            chat_type=chat_type, has_file=has_file, view_type=view_type,
+                            regex=regex, senders=senders, timeout=timeout)
         if name in self._filter_defs:
             raise ValueError("filter {!r} already registered".format(name))
         self._filter_defs[name] = cmd_def
+        self._index = None
         self.logger.debug("registered new filter {!r}".format(name))
 
     def unregister(self, name):
         """ unregister a filter function. """
-        return self._filter_defs.pop(name)
+        filter_def = self._filter_defs.pop(name)
+        self._index = None
+        return filter_def
 
     def dict(self):
         return self._filter_defs.copy()
 
+    @deltabot_hookimpl
+    def deltabot_plugin_removed(self, plugin):
+        for name, filter_def in list(self._filter_defs.items()):
+            if is_plugin_function(filter_def.func, plugin):
+                self.unregister(name)
+
+    def get_index(self):
+        """ return the :class:`FilterIndex` of the registered filters. """
+        index = self._index
+        if index is None:
+            index = self._index = FilterIndex(self._filter_defs.values())
+        return index
+
     @deltabot_hookimpl(trylast=True)
     def deltabot_incoming_message(self, message, replies):
-        for name, filter_def in self._filter_defs.items():
+        for filter_def in self.get_index().get_matching(message):
+            name = filter_def.name
             self.logger.debug("calling filter {!r} on message id={}".format(name, message.id))
-            res = filter_def.func(message=message, replies=replies)
-            assert res is None
+            stats = self.bot.stats
+            timeouts = self.bot.handler_timeouts
+            start = stats.start()
+            try:
+                res = timeouts.call(filter_def.func, dict(message=message), replies,
+                                    filter_def.timeout, "filter", name, start)
+            except HandlerTimeout:
+                # the abandoned filter may still handle the message
+                break
+            except Exception:
+                stats.record("filter", name, start, error=True)
+                raise
+            if inspect.isawaitable(res):
+                res = timeouts.run_async(res, replies, filter_def.timeout, "filter", name)
+                res = stats.record_async("filter", name, start, res)
+                replies.add_pending(self.bot.async_engine.submit(res, name=name))
+            else:
+                stats.record("filter", name, start)
+                if res is True:
+                    self.logger.debug("filter {!r} handled message id={}".format(
+                        name, message.id))
+                    break
+                assert res is None, res
 
 
 class FilterDef:
     """ Definition of a Filter that acts on incoming messages. """
-    def __init__(self, name, short, long, func):
+    def __init__(self, name, short, long, func, priority=0, chat_type=None, has_file=None,
+                 view_type=None, regex=None, senders=None, timeout=None):
+        if chat_type not in (None, "single", "group"):
+            raise ValueError("chat_type must be 'single' or 'group', got {!r}".format(chat_type))
+        if isinstance(view_type, str):
+            view_type = [view_type]
+        if isinstance(senders, str):
+            senders = [senders]
         self.name = name
         self.short = short
         self.long = long
         self.func = func
+        self.timeout = timeout
+        self.priority = priority
+        self.chat_type = chat_type
+        self.has_file = has_file
+        self.view_types = None if view_type is None else frozenset(
+            get_viewtype_code_from_name(name) for name in view_type)
+        self.regex = None if regex is None else re.compile(regex)
+        self.senders = None if senders is None else frozenset(
+            addr.lower() for addr in senders)
 
     def __eq__(self, c):
         return c.__dict__ == self.__dict__
+
+    def matches(self, message):
+        """ return True if the message passes the file, view type and sender
+        preconditions, chat type and regex are checked by the :class:`FilterIndex`. """
+        if self.has_file is not None and bool(message.filename) != self.has_file:
+            return False
+        if self.view_types is not None and message._view_type not in self.view_types:
+            return False
+        if self.senders is not None:
+            return message.get_sender_contact().addr.lower() in self.senders
+        return True
+
+
+class FilterIndex:
+    """ Index of filter definitions by their preconditions.
+
+    Filters are ordered by descending priority, grouped by the chat types
+    they act on and the regular
+    expressions of the filters are combined into one pattern, so that a
+    single match per message finds the filters whose regex matches.
+    Regular expressions with groups or inline flags are searched separately
+    because combining them would change their meaning.
+    Other preconditions are only checked for the remaining filters.
+    """
+    def __init__(self, filter_defs):
+        # sorting is stable, so filters of one priority stay in registration order
+        filter_defs = sorted(filter_defs, key=lambda filter_def: -filter_def.priority)
+        self._by_chat_type = {}
+        for chat_type in ("single", "group"):
+            self._by_chat_type[chat_type] = [
+                filter_def for filter_def in filter_defs
+                if filter_def.chat_type in (None, chat_type)]
+        regex_defs = [filter_def for filter_def in filter_defs
+                      if filter_def.regex is not None and _is_combinable(filter_def.regex)]
+        self._combined, self._group_names = self._combine(regex_defs)
+
+    def _combine(self, regex_defs):
+        if not regex_defs:
+            return None, {}
+        group_names = {}
+        parts = []
+        for i, filter_def in enumerate(regex_defs):
+            group_name = "_filter{}".format(i)
+            group_names[filter_def.name] = group_name
+            # an optional lookahead for each filter searches the whole text
+            # and sets the group if the filter's regex matches
+            parts.append("(?=[\\s\\S]*?(?P<{}>{}))?".format(
+                group_name, _scoped_pattern(filter_def.regex)))
+        try:
+            return re.compile("".join(parts)), group_names
+        except re.error:
+            return None, {}
+
+    def get_matching(self, message):
+        """ iterate over the filter definitions acting on message in calling order.
+
+        Preconditions are checked while iterating, so they are not checked
+        for filters after a filter which stopped the iteration.
+        """
+        chat_type = "group" if message.chat.is_group() else "single"
+        text = groups = None
+        for filter_def in self._by_chat_type[chat_type]:
+            if filter_def.regex is not None:
+                if text is None:
+                    text = message.text or ""
+                    if self._combined is not None:
+                        groups = self._combined.match(text).groupdict()
+                group_name = self._group_names.get(filter_def.name)
+                if group_name is not None:
+                    if groups[group_name] is None:
+                        continue
+                elif filter_def.regex.search(text) is None:
+                    continue
+            if filter_def.matches(message):
+                yield filter_def
+
+
+def _is_combinable(regex):
+    # groups would shift the group numbers and backreferences of the
+    # pattern, inline flags are only allowed at the start of a pattern
+    return regex.groups == 0 and _inline_flags.search(regex.pattern) is None
+
+
+_inline_flags = re.compile(r"\(\?[aiLmsux-]")
+
+
+def _scoped_pattern(regex):
+    flag_chars = (("a", re.ASCII), ("i", re.IGNORECASE), ("m", re.MULTILINE),
+                  ("s", re.DOTALL), ("x", re.VERBOSE))
+    flags = "".join(flag for flag, value in flag_chars if regex.flags & value)
+    if flags:
+        return "(?{}:{})".format(flags, regex.pattern)
+    return "(?:{})".format(regex.pattern)
@@ -25,6 +25,16 @@ class DeltaBotSpecs:
         The returned logger needs to offer info/debug/warn/error methods.
         """
 
+    @deltabot_hookspec(historic=True)
+    def deltabot_init_settings(self, bot, args):
+        """ init the settings storage of a bot -- called before ``deltabot_init``.
+
+        This is also the only init hook called for the reduced bot of
+        subcommands which only access settings, see
+        :class:`deltabot.settings.SettingsBot`, so storage plugins should
+        register their settings hooks here.
+        """
+
     @deltabot_hookspec(historic=True)
     def deltabot_init(self, bot, args):
         """ init a bot -- called before the bot starts serving requests.
@@ -44,6 +54,16 @@ class DeltaBotSpecs:
     def deltabot_shutdown(self, bot):
         """ shutdown all resources of the bot. """
 
+    @deltabot_hookspec
+    def deltabot_plugin_removed(self, name, plugin):
+        """ called after a plugin was removed from the bot.
+
+        Allows dropping commands, filters or other state belonging to it.
+
+        :param name: name under which the plugin was registered.
+        :param plugin: the removed plugin module or object.
+        """
+
     @deltabot_hookspec(firstresult=True)
     def deltabot_incoming_message(self, message, bot, replies):
         """ process an incoming fresh message.
@@ -52,6 +72,22 @@ class DeltaBotSpecs:
         :param replies: call replies.add() to schedule a reply.
         """
 
+    @deltabot_hookspec
+    def deltabot_replies_sent(self, bot, incoming_message, messages):
+        """ called after replies to an incoming message were handed to core.
+
+        :param incoming_message: The message which the replies were added for.
+        :param messages: list of sent reply messages.
+        """
+
+    @deltabot_hookspec
+    def deltabot_replies_failed(self, bot, incoming_message, error):
+        """ called when sending replies to an incoming message failed.
+
+        :param incoming_message: The message which the replies were added for.
+        :param error: The exception which occurred while sending.
+        """
+
     @deltabot_hookspec(firstresult=True)
     def deltabot_member_added(self, chat, contact, actor, message, replies):
         """ When a member has been added by an actor.
@@ -86,5 +122,25 @@ class DeltaBotSpecs:
         """ get a named persistent bot setting."""
 
     @deltabot_hookspec(firstresult=True)
-    def deltabot_list_settings(self):
-        """ get a list of persistent (key, value) tuples. """
+    def deltabot_store_settings(self, items):
+        """ store many named bot settings persistently in one transaction.
+
+        :param items: list of (key, value) tuples, a value of None deletes the key.
+        :returns: True if the settings were stored.
+        """
+
+    @deltabot_hookspec(firstresult=True)
+    def deltabot_get_settings(self, keys):
+        """ get many named persistent bot settings.
+
+        :param keys: list of keys.
+        :returns: dict mapping existing keys to their values.
+        """
+
+    @deltabot_hookspec(firstresult=True)
+    def deltabot_list_settings(self, scope):
+        """ get an iterable of persistent (key, value) tuples.
+
+        :param scope: if not None, only settings with keys starting with
+                      ``scope + "/"`` need to be returned.
+        """
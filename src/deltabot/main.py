@@ -1,37 +1,56 @@
-
 import os
 import sys
 
-from deltachat import Account
-
 from .plugins import get_global_plugin_manager
 from .parser import get_base_parser, MyArgumentParser
-from .bot import DeltaBot
+from .startup import StartupReport
 
 
 def main(argv=None):
     """delta.chat bot management command line interface."""
-    pm = get_global_plugin_manager()
     if argv is None:
         argv = sys.argv
+    if argv[1:] == ["--version"]:
+        # answer without loading any plugins
+        from deltabot import __version__
+        print(__version__)
+        return
+    report = StartupReport()
+    with report.timed("make_plugin_manager", "entry points"):
+        pm = get_global_plugin_manager(lazy=True, startup_report=report)
     try:
-        parser = get_base_parser(plugin_manager=pm, argv=argv)
+        with report.timed_hookimpls(pm, "deltabot_init_parser"):
+            parser = get_base_parser(plugin_manager=pm, argv=argv)
         args = parser.main_parse_argv(argv)
     except MyArgumentParser.ArgumentError as ex:
         print(str(ex), file=sys.stderr)
         sys.exit(1)
-    bot = make_bot_from_args(args, plugin_manager=pm)
+    bot = make_bot_from_args(args, plugin_manager=pm, startup_report=report)
     parser.main_run(bot=bot, args=args)
 
 
-def make_bot_from_args(args, plugin_manager, account=None):
+def make_bot_from_args(args, plugin_manager, account=None, startup_report=None):
     basedir = os.path.abspath(os.path.expanduser(args.basedir))
     if not os.path.exists(basedir):
         os.makedirs(basedir)
 
+    logger = plugin_manager.hook.deltabot_get_logger(args=args)
+    subcommand = getattr(args, "subcommand_instance", None)
+    if account is None and getattr(subcommand, "settings_only", False):
+        from .settings import SettingsBot
+        return SettingsBot(basedir, logger, plugin_manager=plugin_manager, args=args)
+
+    if startup_report is None:
+        startup_report = StartupReport()
+    # the deltachat bindings are only imported for commands which need them
+    with startup_report.timed("import", "deltachat"):
+        from deltachat import Account
+        from .bot import DeltaBot
+
     if account is None:
         db_path = os.path.join(basedir, "account.db")
-        account = Account(db_path, "deltabot/{}".format(sys.platform))
+        with startup_report.timed("Account", db_path):
+            account = Account(db_path, "deltabot/{}".format(sys.platform))
 
-    logger = plugin_manager.hook.deltabot_get_logger(args=args)
-    return DeltaBot(account, logger, plugin_manager=plugin_manager, args=args)
+    return DeltaBot(account, logger, plugin_manager=plugin_manager, args=args,
+                    startup_report=startup_report)
@@ -0,0 +1,126 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from .stats import Histogram
+
+
+#: help texts of the event counters recorded in :class:`deltabot.stats.Stats`
+COUNTERS = [
+    ("messages_incoming", "incoming messages reported by core"),
+    ("messages_processed", "fresh messages processed by the bot"),
+    ("messages_rate_limited", "messages delayed or dropped by rate limits"),
+    ("incoming_queue_full", "times fresh messages were deferred because the queue was full"),
+    ("replies_sent", "reply messages handed to core for sending"),
+    ("replies_failed", "reply messages which failed to send"),
+    ("handlers_timed_out", "command and filter calls which exceeded their timeout"),
+]
+
+
+def format_metrics(bot):
+    """ return the bot's statistics in the prometheus text exposition format. """
+    snapshot = bot.stats.snapshot()
+    lines = []
+
+    def add_metric(name, mtype, help):
+        lines.append("# HELP {} {}".format(name, help))
+        lines.append("# TYPE {} {}".format(name, mtype))
+
+    for counter, help in COUNTERS:
+        name = "deltabot_{}_total".format(counter)
+        add_metric(name, "counter", help)
+        lines.append("{} {}".format(name, snapshot["counters"].get(counter, 0)))
+
+    add_metric("deltabot_queue_depth", "gauge", "work items waiting in a queue")
+    lines.append('deltabot_queue_depth{{queue="incoming"}} {}'.format(
+        bot._eventhandler.qsize()))
+    lines.append('deltabot_queue_depth{{queue="outgoing"}} {}'.format(bot._sender.qsize()))
+    add_metric("deltabot_queue_capacity", "gauge",
+               "maximum number of work items waiting in a queue")
+    lines.append('deltabot_queue_capacity{{queue="incoming"}} {}'.format(
+        bot._eventhandler.queue_capacity()))
+
+    handlers = snapshot["handlers"]
+    add_metric("deltabot_handler_calls_total", "counter", "calls of hooks, commands and filters")
+    for kind, name, d in handlers:
+        lines.append("deltabot_handler_calls_total{{{}}} {}".format(
+            _labels(kind, name), d["calls"]))
+    add_metric("deltabot_handler_errors_total", "counter",
+               "failed calls of hooks, commands and filters")
+    for kind, name, d in handlers:
+        lines.append("deltabot_handler_errors_total{{{}}} {}".format(
+            _labels(kind, name), d["errors"]))
+    add_metric("deltabot_handler_latency_seconds", "histogram",
+               "latency of hooks, commands and filters")
+    for kind, name, d in handlers:
+        labels = _labels(kind, name)
+        hist = Histogram.from_dict(d["latency"])
+        cumulative = 0
+        for bound, count in zip(hist.bounds, hist.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append('deltabot_handler_latency_seconds_bucket{{{},le="{}"}} {}'.format(
+                labels, le, cumulative))
+        lines.append("deltabot_handler_latency_seconds_sum{{{}}} {}".format(labels, hist.sum))
+        lines.append("deltabot_handler_latency_seconds_count{{{}}} {}".format(
+            labels, hist.count))
+    return "\n".join(lines) + "\n"
+
+
+def _labels(kind, name):
+    return 'kind="{}",name="{}"'.format(_escape(kind), _escape(name))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsServer:
+    """ HTTP server exposing the bot's statistics at ``/metrics``.
+
+    Meant to be scraped by prometheus, it only listens on localhost by default.
+    """
+    def __init__(self, bot, port, host="127.0.0.1"):
+        self.bot = bot
+        self.logger = bot.logger
+        self._server = _HTTPServer((host, port), _MetricsRequestHandler)
+        self._server.bot = bot
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def start(self):
+        self.logger.info("serving metrics at http://{}:{}/metrics".format(*self.address))
+        self._thread = t = threading.Thread(target=self._server.serve_forever,
+                                            name="bot-metrics-server")
+        t.setDaemon(1)
+        t.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join(timeout=10)
+            self._thread = None
+        self._server.server_close()
+
+
+class _HTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = format_metrics(self.server.bot).encode("utf8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        self.server.bot.logger.debug("metrics request: " + format % args)
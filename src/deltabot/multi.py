@@ -0,0 +1,90 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from deltachat import Account
+
+from .asyncengine import AsyncEngine
+from .bot import DeltaBot
+from .plugins import make_plugin_manager
+from .workers import ChatWorkerPool, PriorityWorkerPool
+
+
+def find_basedirs(accounts_dir):
+    """ return the subdirectories of accounts_dir which contain a bot account. """
+    basedirs = []
+    for name in sorted(os.listdir(accounts_dir)):
+        path = os.path.join(accounts_dir, name)
+        if os.path.exists(os.path.join(path, "account.db")):
+            basedirs.append(path)
+    return basedirs
+
+
+class BotGroup:
+    """ several bots served from one process.
+
+    Every bot has its own account, plugin manager, settings and event
+    handler thread, while plugin modules are only imported once.  The
+    messages and replies of all bots are processed by shared worker and
+    sender threads, async handlers run on a shared event loop and
+    handlers with a timeout in a shared thread pool.  Note that plugins
+    keeping state in module globals share it between all bots.
+    """
+
+    #: maximum number of threads running synchronous handlers with a timeout
+    max_handler_threads = 32
+
+    def __init__(self, basedirs, args, logger=None):
+        #: logger for the shared threads, by default the one of the first bot
+        self.logger = logger
+        self.async_engine = None
+        self.handler_executor = ThreadPoolExecutor(self.max_handler_threads,
+                                                   thread_name_prefix="bot-handler")
+        self.bots = [self.make_bot(basedir, args) for basedir in basedirs]
+        self.worker_pool = None
+        self.sender_pool = None
+
+    def make_bot(self, basedir, args):
+        """ return a bot for basedir, with args applying to all bots of the group. """
+        bot_args = argparse.Namespace(**vars(args))
+        bot_args.basedir = basedir
+        pm = make_plugin_manager(lazy=True)
+        logger = pm.hook.deltabot_get_logger(args=bot_args)
+        # tell the log lines of the bots apart
+        logger.name = "deltabot.{}".format(os.path.basename(basedir))
+        db_path = os.path.join(basedir, "account.db")
+        account = Account(db_path, "deltabot/{}".format(sys.platform))
+        if self.logger is None:
+            self.logger = logger
+        if self.async_engine is None:
+            self.async_engine = AsyncEngine(logger=self.logger)
+        return DeltaBot(account, logger, plugin_manager=pm, args=bot_args,
+                        async_engine=self.async_engine, handler_executor=self.handler_executor)
+
+    def start(self, workers=0, senders=0, queue_size=1000):
+        """ start all bots, see :meth:`deltabot.bot.DeltaBot.start`.
+
+        The workers, senders and queue_size are shared by all bots.
+        """
+        self.async_engine.start()
+        if workers:
+            self.worker_pool = PriorityWorkerPool(workers, logger=self.logger,
+                                                  maxsize=queue_size)
+            self.worker_pool.start()
+        if senders:
+            self.sender_pool = ChatWorkerPool(senders, logger=self.logger,
+                                              name="bot-sender", maxsize=100)
+            self.sender_pool.start()
+        for bot in self.bots:
+            bot.start(worker_pool=self.worker_pool, sender_pool=self.sender_pool)
+
+    def wait_shutdown(self):
+        """ wait until all bot accounts are shut down and stop the shared threads. """
+        for bot in self.bots:
+            bot.wait_shutdown()
+        for pool in (self.worker_pool, self.sender_pool):
+            if pool is not None:
+                pool.stop()
+        self.async_engine.stop()
+        self.handler_executor.shutdown(wait=False)
@@ -29,7 +29,12 @@ class MyArgumentParser(argparse.ArgumentParser):
         action.inipath = inipath
 
     def add_subcommand(self, cls):
-        """ Add a subcommand to deltabot. """
+        """ Add a subcommand to deltabot.
+
+        Subcommand classes with a true ``settings_only`` attribute are run
+        with a :class:`deltabot.settings.SettingsBot`, which starts much
+        faster than a full bot with its Delta Chat account.
+        """
         if not hasattr(self, "subparsers"):
             raise ValueError("can not add sub command to subcommand")
         doc, description = parse_docstring(cls.__doc__)
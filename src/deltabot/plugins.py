@@ -1,8 +1,27 @@
 
+import inspect
+import json
+import os
+import threading
+import warnings
+
 import pluggy
 
 from .hookspec import spec_name, DeltaBotSpecs
 
+try:
+    from importlib import metadata
+except ImportError:  # python < 3.8
+    import importlib_metadata as metadata
+
+try:
+    from pluggy._manager import DistFacade
+except ImportError:  # pluggy < 1.0
+    from pluggy.manager import DistFacade
+
+#: setuptools entry point group of deltabot plugins
+ENTRYPOINT_GROUP = "deltabot.plugins"
+
 
 class Plugins:
     def __init__(self, logger, plugin_manager):
@@ -18,9 +37,15 @@ class Plugins:
         self._pm.check_pending()
 
     def remove(self, name):
-        """ remove a named deltabot plugin. """
+        """ remove a named deltabot plugin and return it.
+
+        Commands and filters registered with functions of the plugin
+        are unregistered as well.
+        """
         self.logger.debug("removing plugin {!r}".format(name))
-        self._pm.unregister(name=name)
+        plugin = self._pm.unregister(name=name)
+        self._pm.hook.deltabot_plugin_removed(name=name, plugin=plugin)
+        return plugin
 
     def dict(self):
         """ return a dict name->deltabot plugin object mapping. """
@@ -31,18 +56,204 @@ class Plugins:
         return self._pm.list_name_plugin()
 
 
+def is_plugin_function(func, plugin):
+    """ return True if func is a function of the plugin module or a method of
+    the plugin object. """
+    if isinstance(plugin, LazyPlugin):
+        if plugin.plugin is None:
+            return False
+        plugin = plugin.plugin
+    if inspect.ismodule(plugin):
+        return getattr(func, "__module__", None) == plugin.__name__
+    return getattr(func, "__self__", None) is plugin
+
+
+class LazyPlugin:
+    """ stand-in for a setuptools plugin which is imported on first use.
+
+    The stand-in offers the hook implementations recorded for the plugin in
+    the entry point index.  The first call of any of them imports the
+    plugin and this and all later calls are forwarded to the real hook
+    implementations.
+    """
+    def __init__(self, entrypoint, hooks, index_path=None):
+        self.entrypoint = entrypoint
+        #: the imported plugin or None if none of its hooks was called yet
+        self.plugin = None
+        self._hook_names = set(hooks)
+        self._index_path = index_path
+        self._lock = threading.RLock()
+        for name, info in hooks.items():
+            setattr(self, name, _make_hook_stub(self, name, info["argnames"], info["opts"]))
+
+    def __repr__(self):
+        return "<lazy plugin {!r} from {!r}>".format(self.entrypoint.name, self.entrypoint.value)
+
+    def load(self):
+        """ import the plugin if needed and return it. """
+        with self._lock:
+            if self.plugin is None:
+                plugin = self.entrypoint.load()
+                hook_names = _get_hook_names(plugin)
+                if hook_names != self._hook_names and self._index_path:
+                    # the plugin changed without a new version, e.g. in a
+                    # development install: rebuild the index on the next start
+                    warnings.warn(
+                        "hooks of plugin {!r} changed since the plugin index was built, "
+                        "hooks missing until the next start: {}".format(
+                            self.entrypoint.name,
+                            ", ".join(sorted(hook_names - self._hook_names)) or "none"))
+                    try:
+                        os.remove(self._index_path)
+                    except OSError:
+                        pass
+                self.plugin = plugin
+        return self.plugin
+
+
+def _make_hook_stub(lazy_plugin, name, argnames, opts):
+    if opts.get("hookwrapper") or opts.get("wrapper"):
+        def stub(*args):
+            return (yield from getattr(lazy_plugin.load(), name)(*args))
+    else:
+        def stub(*args):
+            return getattr(lazy_plugin.load(), name)(*args)
+    stub.__name__ = name
+    # pluggy passes hook arguments by the names in the signature
+    stub.__signature__ = inspect.Signature([
+        inspect.Parameter(arg, inspect.Parameter.POSITIONAL_OR_KEYWORD) for arg in argnames])
+    setattr(stub, spec_name + "_impl", dict(opts))
+    return stub
+
+
+def _get_hook_names(plugin):
+    return set(name for name in dir(plugin)
+               if getattr(getattr(plugin, name, None), spec_name + "_impl", None) is not None)
+
+
+def get_plugin_hooks(pm, plugin):
+    """ return a json-serializable description of the hook implementations
+    of a registered plugin for the entry point index. """
+    impls = [impl for caller in pm.get_hookcallers(plugin) or ()
+             for impl in caller.get_hookimpls() if impl.plugin is plugin]
+    hooks = {}
+    for name in dir(plugin):
+        opts = pm.parse_hookimpl_opts(plugin, name)
+        if opts is None:
+            continue
+        function = getattr(plugin, name)
+        for impl in impls:
+            if impl.function == function:
+                hooks[name] = dict(opts=dict(opts), argnames=list(impl.argnames))
+    return hooks
+
+
+def get_plugin_index_path():
+    """ return the path of the cached entry point index or None if disabled.
+
+    The path can be set with the DELTABOT_PLUGIN_INDEX environment variable,
+    an empty value disables lazy plugin loading.
+    """
+    path = os.environ.get("DELTABOT_PLUGIN_INDEX")
+    if path is None:
+        cachedir = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+        path = os.path.join(cachedir, "deltabot", "plugin-index.json")
+    return path or None
+
+
+def iter_entrypoints(group):
+    """ yield (distribution, entry point) pairs of group without importing them. """
+    for dist in metadata.distributions():
+        for ep in dist.entry_points:
+            if ep.group == group:
+                yield dist, ep
+
+
+def load_entrypoints(pm, group, startup_report=None):
+    """ import and register the setuptools plugins of group.
+
+    With a startup_report, the plugins are loaded one by one like pluggy's
+    ``load_setuptools_entrypoints`` does, recording the import time of
+    every plugin.
+    """
+    if startup_report is None:
+        pm.load_setuptools_entrypoints(group)
+        return
+    for dist, ep in iter_entrypoints(group):
+        if pm.get_plugin(ep.name) or pm.is_blocked(ep.name):
+            continue
+        with startup_report.timed("import plugin", ep.name):
+            plugin = ep.load()
+        pm.register(plugin, name=ep.name)
+        pm._plugin_distinfo.append((plugin, DistFacade(dist)))
+
+
+def load_lazy_entrypoints(pm, group, index_path, startup_report=None):
+    """ register the setuptools plugins of group as :class:`LazyPlugin` stand-ins.
+
+    The hook implementations of the plugins are read from the index at
+    index_path.  If the index does not match the installed distributions
+    and deltabot version, all plugins are imported and registered as usual
+    and the index is rebuilt.
+    """
+    from deltabot import __version__
+
+    entrypoints = [(dist, ep) for dist, ep in iter_entrypoints(group)
+                   if not pm.get_plugin(ep.name) and not pm.is_blocked(ep.name)]
+    key = [__version__] + [[dist.metadata["name"], dist.version, ep.name, ep.value]
+                           for dist, ep in entrypoints]
+    index = None
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        pass
+    if index is None or index.get("key") != key:
+        load_entrypoints(pm, group, startup_report)
+        plugins = {}
+        for dist, ep in entrypoints:
+            plugin = pm.get_plugin(ep.name)
+            if plugin is not None:
+                plugins[ep.name] = get_plugin_hooks(pm, plugin)
+        _write_index(index_path, dict(key=key, plugins=plugins))
+        return
+    for dist, ep in entrypoints:
+        plugin = LazyPlugin(ep, index["plugins"].get(ep.name, {}), index_path=index_path)
+        pm.register(plugin, name=ep.name)
+        # keep the plugins listed like the ones loaded by pluggy
+        pm._plugin_distinfo.append((plugin, DistFacade(dist)))
+
+
+def _write_index(path, index):
+    tmp_path = "{}.{}".format(path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        # starting up does not depend on the index
+        pass
+
+
 _pm = None
 
 
-def get_global_plugin_manager():
+def get_global_plugin_manager(lazy=False, startup_report=None):
     global _pm
     if _pm is None:
-        _pm = make_plugin_manager()
+        _pm = make_plugin_manager(lazy=lazy, startup_report=startup_report)
     return _pm
 
 
-def make_plugin_manager():
-    from deltabot.builtin import db, cmdline, log, settings
+def make_plugin_manager(lazy=False, startup_report=None):
+    """ return a plugin manager with the builtin and setuptools plugins registered.
+
+    With lazy=True, setuptools plugins are only imported when one of their
+    hooks is called, see :func:`load_lazy_entrypoints`.  The import time of
+    every imported setuptools plugin is recorded in the startup_report.
+    """
+    from deltabot.builtin import db, cmdline, log, settings, stats, ratelimit, timeouts
 
     pm = pluggy.PluginManager(spec_name)
     pm.add_hookspecs(DeltaBotSpecs)
@@ -52,7 +263,14 @@ def make_plugin_manager():
     pm.register(plugin=db, name=".builtin.db")
     pm.register(plugin=cmdline, name=".builtin.cmdline")
     pm.register(plugin=log, name=".builtin.log")
+    pm.register(plugin=stats, name=".builtin.stats")
+    pm.register(plugin=ratelimit, name=".builtin.ratelimit")
+    pm.register(plugin=timeouts, name=".builtin.timeouts")
     pm.check_pending()
     # register setuptools modules
-    pm.load_setuptools_entrypoints("deltabot.plugins")
+    index_path = get_plugin_index_path() if lazy else None
+    if index_path is not None:
+        load_lazy_entrypoints(pm, ENTRYPOINT_GROUP, index_path, startup_report)
+    else:
+        load_entrypoints(pm, ENTRYPOINT_GROUP, startup_report)
     return pm
@@ -0,0 +1,147 @@
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from .plugins import LazyPlugin
+
+
+class Profiler:
+    """ sampling profiler for incoming message processing.
+
+    While running, a sampler thread periodically records the call stacks
+    of threads which are processing a profiled message.  Every sample is
+    attributed to the innermost plugin (as registered in
+    :class:`deltabot.plugins.Plugins`) found on the stack.  Stopping the
+    profiler writes the aggregated stacks in the "collapsed" format used
+    by flamegraph tools and a per-plugin summary into the bot's basedir.
+
+    Note that coroutines of async handlers run on the event loop thread
+    and are not sampled.
+    """
+    def __init__(self, bot, interval=0.005):
+        self.bot = bot
+        self.logger = bot.logger
+        self.interval = interval
+        self.outdir = os.path.dirname(bot.account.db_path)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self._reset(every=1, duration=None)
+
+    def _reset(self, every, duration):
+        self.every = every
+        self._deadline = time.time() + duration if duration else None
+        self._num_messages = 0
+        self._active = set()
+        self._stacks = Counter()
+        self._plugin_samples = Counter()
+        self._plugin_files = None
+
+    def is_running(self):
+        return self._running
+
+    def start(self, every=1, duration=None):
+        """ start profiling every Nth message, for duration seconds if given. """
+        with self._lock:
+            if self._running:
+                raise ValueError("profiler is already running")
+            self._reset(every=every, duration=duration)
+            self._running = True
+            self._thread = t = threading.Thread(target=self._sample_loop, name="bot-profiler")
+            t.setDaemon(1)
+            t.start()
+        self.logger.info("profiling every {} message(s){}".format(
+            every, " for {} seconds".format(duration) if duration else ""))
+
+    def stop(self):
+        """ stop profiling and return the paths of the written profile files. """
+        with self._lock:
+            if self._thread is None:
+                return []
+            self._running = False
+            thread, self._thread = self._thread, None
+        if thread is not threading.current_thread():
+            thread.join(timeout=10)
+        return self.write()
+
+    @contextmanager
+    def profile_message(self):
+        """ context manager around processing a message in the current thread. """
+        if not self._running:
+            yield
+            return
+        with self._lock:
+            self._num_messages += 1
+            selected = (self._num_messages - 1) % self.every == 0
+        if not selected:
+            yield
+            return
+        ident = threading.get_ident()
+        self._active.add(ident)
+        try:
+            yield
+        finally:
+            self._active.discard(ident)
+
+    def _sample_loop(self):
+        while self._running:
+            if self._deadline is not None and time.time() >= self._deadline:
+                self.stop()
+                break
+            frames = sys._current_frames()
+            for ident in list(self._active):
+                frame = frames.get(ident)
+                if frame is not None:
+                    self._record(frame)
+            del frames
+            time.sleep(self.interval)
+
+    def _record(self, frame):
+        plugin_files = self._get_plugin_files()
+        plugin = None
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append("{}:{}".format(os.path.basename(code.co_filename), code.co_name))
+            if plugin is None:
+                plugin = plugin_files.get(code.co_filename)
+            frame = frame.f_back
+        self._stacks[";".join(reversed(stack))] += 1
+        self._plugin_samples[plugin or "<core>"] += 1
+
+    def _get_plugin_files(self):
+        if self._plugin_files is None:
+            self._plugin_files = files = {}
+            for name, plugin in self.bot.plugins.items():
+                if isinstance(plugin, LazyPlugin):
+                    plugin = plugin.plugin
+                    if plugin is None:
+                        continue
+                module = plugin if inspect.ismodule(plugin) else inspect.getmodule(plugin)
+                path = getattr(module, "__file__", None)
+                if path is not None:
+                    files.setdefault(path, name)
+        return self._plugin_files
+
+    def write(self):
+        """ write collapsed stacks and the per-plugin summary, return their paths. """
+        total = sum(self._plugin_samples.values())
+        basename = os.path.join(self.outdir, "profile-{}".format(
+            time.strftime("%Y%m%d-%H%M%S")))
+        collapsed_path = basename + ".collapsed"
+        with open(collapsed_path, "w") as f:
+            for stack, count in self._stacks.most_common():
+                f.write("{} {}\n".format(stack, count))
+        plugins_path = basename + ".plugins.txt"
+        with open(plugins_path, "w") as f:
+            f.write("{} samples of {} profiled messages, {}ms interval\n".format(
+                total, (self._num_messages + self.every - 1) // self.every,
+                self.interval * 1000))
+            for name, count in self._plugin_samples.most_common():
+                f.write("{:6.1f}% {:8d} {}\n".format(100.0 * count / total, count, name))
+        self.logger.info("wrote profile to {} and {}".format(collapsed_path, plugins_path))
+        return [collapsed_path, plugins_path]
@@ -1,5 +1,7 @@
 
 import os
+import time
+import tracemalloc
 import py
 from email.utils import parseaddr
 from queue import Queue
@@ -14,6 +16,7 @@ from .parser import get_base_parser
 from .main import make_bot_from_args
 from .plugins import make_plugin_manager
 from .bot import Replies
+from .stats import format_duration, percentile
 
 
 @pytest.fixture
@@ -82,6 +85,140 @@ def mocker(mock_bot):
     return Mocker()
 
 
+@pytest.fixture
+def bot_bench(mocker):
+    """ measure latency and allocations of commands and message processing. """
+    return BotBench(mocker)
+
+
+class BotBench:
+    """ run bot operations in a loop and check them against a budget.
+
+    Budgets are given as keyword arguments, time limits in seconds
+    (``mean``, ``p50``, ``p95``, ``p99``, ``max``) and allocation
+    limits in bytes per call (``peak_alloc``, ``retained``), for example::
+
+        def test_fast_help(bot_bench):
+            bot_bench.run_command("/help", p95=0.005, peak_alloc=100000)
+
+    The test fails if a measured value exceeds its budget.
+    """
+    def __init__(self, mocker):
+        self.mocker = mocker
+        self.bot = mocker.bot
+
+    def run_command(self, text, rounds=100, **budget):
+        """ benchmark :meth:`Mocker.run_command` with the given command text. """
+        return self.measure(lambda: self.mocker.run_command(text),
+                            name=text, rounds=rounds, **budget)
+
+    def process_message(self, text, group=False, rounds=100, **budget):
+        """ benchmark processing an incoming message by all plugins.
+
+        Creating the incoming message is not measured.
+        """
+        def setup():
+            return (self.mocker.make_incoming_message(text, group=group),)
+
+        def process(message):
+            replies = Replies(message, self.bot.logger)
+            self.bot.plugins.hook.deltabot_incoming_message(
+                message=message, bot=self.bot, replies=replies)
+            replies.send_reply_messages()
+
+        return self.measure(process, setup=setup, name=text, rounds=rounds, **budget)
+
+    def measure(self, func, setup=None, name=None, rounds=100, warmup=3,
+                alloc_rounds=10, **budget):
+        """ call func rounds times, check the budget and return a :class:`BenchResult`.
+
+        :param setup: function returning a tuple of arguments for each func call,
+                      it is not measured.
+        :param alloc_rounds: number of extra calls to func with memory tracing.
+        """
+        __tracebackhide__ = True
+        for i in range(warmup):
+            func(*(setup() if setup else ()))
+        latencies = []
+        for i in range(rounds):
+            args = setup() if setup else ()
+            start = time.perf_counter()
+            func(*args)
+            latencies.append(time.perf_counter() - start)
+        peak_alloc, retained = self._measure_allocations(func, setup, alloc_rounds)
+        result = BenchResult(name or getattr(func, "__name__", repr(func)),
+                             latencies, peak_alloc, retained)
+        print(result)
+        result.check_budget(**budget)
+        return result
+
+    def _measure_allocations(self, func, setup, rounds):
+        if not rounds:
+            return 0, 0
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        try:
+            peak_alloc = total_retained = 0
+            for i in range(rounds):
+                args = setup() if setup else ()
+                before = tracemalloc.get_traced_memory()[0]
+                # without reset_peak (python < 3.9) the peak is the overall one
+                if hasattr(tracemalloc, "reset_peak"):
+                    tracemalloc.reset_peak()
+                func(*args)
+                current, peak = tracemalloc.get_traced_memory()
+                peak_alloc = max(peak_alloc, peak - before)
+                total_retained += current - before
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+        return peak_alloc, total_retained // rounds
+
+
+class BenchResult:
+    """ latencies in seconds and allocations in bytes per call of a benchmark. """
+
+    budget_keys = ("mean", "p50", "p95", "p99", "max", "peak_alloc", "retained")
+
+    def __init__(self, name, latencies, peak_alloc, retained):
+        self.name = name
+        self.latencies = latencies = sorted(latencies)
+        self.rounds = len(latencies)
+        self.mean = sum(latencies) / len(latencies) if latencies else 0.0
+        self.p50 = percentile(latencies, 0.5)
+        self.p95 = percentile(latencies, 0.95)
+        self.p99 = percentile(latencies, 0.99)
+        self.max = latencies[-1] if latencies else 0.0
+        self.peak_alloc = peak_alloc
+        self.retained = retained
+
+    def __str__(self):
+        return "bench {!r}: rounds={} mean={} p50={} p95={} p99={} max={} " \
+               "peak_alloc={}B retained={}B".format(
+                   self.name, self.rounds, *[format_duration(getattr(self, key))
+                                             for key in self.budget_keys[:5]],
+                   self.peak_alloc, self.retained)
+
+    def check_budget(self, **budget):
+        """ fail the current test if a measured value exceeds its budget. """
+        __tracebackhide__ = True
+        failures = []
+        for key, limit in sorted(budget.items()):
+            if key not in self.budget_keys:
+                raise ValueError("unknown budget {!r}, use one of {}".format(
+                    key, ", ".join(self.budget_keys)))
+            value = getattr(self, key)
+            if value > limit:
+                if key in ("peak_alloc", "retained"):
+                    failures.append("{}={}B > {}B".format(key, value, limit))
+                else:
+                    failures.append("{}={} > {}".format(
+                        key, format_duration(value), format_duration(limit)))
+        if failures:
+            pytest.fail("bench {!r} exceeds budget: {}".format(self.name, ", ".join(failures)))
+
+
 @pytest.fixture
 def bot_tester(acfactory, request):
     ac1, ac2 = acfactory.get_two_online_accounts()
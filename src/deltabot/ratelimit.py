@@ -0,0 +1,136 @@
+import threading
+import time
+
+from .cache import LRUCache
+
+
+def parse_rate(spec):
+    """ parse a "COUNT/SECONDS" rate specification into a (count, seconds) tuple. """
+    count, sep, seconds = spec.partition("/")
+    try:
+        count, seconds = int(count), float(seconds or 1)
+    except ValueError:
+        raise ValueError("invalid rate {!r}, use COUNT/SECONDS".format(spec))
+    if count < 1 or seconds <= 0:
+        raise ValueError("invalid rate {!r}, COUNT and SECONDS must be positive".format(spec))
+    return count, seconds
+
+
+class TokenBucket:
+    """ bucket of up to burst tokens which refills at rate tokens per second. """
+    __slots__ = ("burst", "rate", "tokens", "updated", "noticed")
+
+    def __init__(self, burst, rate, now):
+        self.burst = burst
+        self.rate = rate
+        self.tokens = float(burst)
+        self.updated = now
+        #: True if the sender was notified since the bucket ran empty
+        self.noticed = False
+
+    def refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self):
+        """ return seconds until the next token is available. """
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """ per-contact and per-chat token bucket limits for incoming messages.
+
+    A message may be processed if both the bucket of its sender and the
+    bucket of its chat hold a token.  Buckets are created full and only
+    the most recently used ``max_buckets`` are kept, forgotten ones are
+    full again when they are next needed.
+
+    :param contact_limit: (count, seconds) tuple allowing bursts of count
+                          messages per contact, refilled over seconds, or None.
+    :param chat_limit: the same for all messages of a chat, or None.
+    :param action: "drop", "delay" or "notice", see :class:`deltabot.bot.CheckAll`.
+    :param persistent: if True, the bucket states are stored in the bot
+                       settings at shutdown and restored at startup.
+    """
+
+    #: reply sent once with the "notice" action until the sender is allowed again
+    notice = "You are sending messages too fast, please wait {seconds} seconds."
+
+    def __init__(self, contact_limit=None, chat_limit=None, action="notice",
+                 persistent=False, max_buckets=10000, max_delay=60.0):
+        if action not in ("drop", "delay", "notice"):
+            raise ValueError("unknown rate limit action {!r}".format(action))
+        self.limits = dict(contact=contact_limit, chat=chat_limit)
+        self.action = action
+        self.persistent = persistent
+        #: delayed messages which would have to wait longer are dropped
+        self.max_delay = max_delay
+        self._buckets = LRUCache(max_buckets)
+        self._lock = threading.Lock()
+
+    def _get_bucket(self, kind, ident, now):
+        limit = self.limits[kind]
+        if limit is None:
+            return None
+        key = "{}-{}".format(kind, ident)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            count, seconds = limit
+            bucket = TokenBucket(count, count / seconds, now)
+            self._buckets.put(key, bucket)
+        else:
+            bucket.refill(now)
+        return bucket
+
+    def check(self, contact_id, chat_id, now=None):
+        """ take a token for a message of contact_id in chat_id if available.
+
+        :returns: (wait, notify) tuple.  wait is 0.0 if the message may be
+                  processed, otherwise the seconds until it may be.  notify
+                  is True for the first limited message since the sender
+                  was last allowed.
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            buckets = [bucket for bucket in (self._get_bucket("contact", contact_id, now),
+                                             self._get_bucket("chat", chat_id, now))
+                       if bucket is not None]
+            wait = max([bucket.wait_time() for bucket in buckets] or [0.0])
+            if not wait:
+                for bucket in buckets:
+                    bucket.tokens -= 1
+                    bucket.noticed = False
+                return 0.0, False
+            # notices go to the sender, so they are tracked on the first bucket
+            notify = not buckets[0].noticed
+            buckets[0].noticed = True
+            return wait, notify
+
+    def dump(self, now=None):
+        """ return (name, value) items for all buckets which are not full. """
+        if now is None:
+            now = time.time()
+        items = []
+        with self._lock:
+            for key, bucket in self._buckets.items():
+                bucket.refill(now)
+                if bucket.tokens < bucket.burst:
+                    items.append((key, "{} {}".format(bucket.tokens, bucket.updated)))
+        return items
+
+    def load(self, items):
+        """ restore buckets from (name, value) items returned by :meth:`dump`. """
+        with self._lock:
+            for key, value in items:
+                kind, sep, ident = key.partition("-")
+                if self.limits.get(kind) is None:
+                    continue
+                try:
+                    tokens, updated = map(float, value.split())
+                except ValueError:
+                    continue
+                bucket = self._get_bucket(kind, ident, updated)
+                bucket.tokens = min(tokens, bucket.burst)
+                bucket.updated = updated
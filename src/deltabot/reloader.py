@@ -0,0 +1,149 @@
+import importlib
+import inspect
+import os
+import sys
+import threading
+
+import py
+
+from .builtin.cmdline import AddModule
+
+
+def get_module_paths(bot):
+    """ return the paths of the python modules added with "deltabot add-module". """
+    return [path for path in bot.get(AddModule.db_key, "").split("\n") if path]
+
+
+def load_module(bot, path):
+    """ import the python module at path and register it as bot plugin. """
+    mod = py.path.local(path).pyimport()
+    bot.plugins.add_module(name=os.path.basename(path), module=mod)
+    return mod
+
+
+def unload_module(bot, path):
+    """ shut down and remove the plugin of the python module at path.
+
+    Plugin objects which the module registered from its own classes are
+    removed as well, together with all commands and filters of the module.
+    """
+    module = bot.plugins.dict().get(os.path.basename(path))
+    if module is None:
+        return None
+    names = [name for name, plugin in bot.plugins.items()
+             if plugin is module or _is_defined_in(plugin, module)]
+    plugins = bot.plugins.dict()
+    _call_hook_for(bot.plugins._pm, "deltabot_shutdown", [plugins[name] for name in names],
+                   bot=bot)
+    for name in names:
+        bot.plugins.remove(name)
+    return module
+
+
+def reload_module(bot, path):
+    """ re-import the python module at path and replace its bot plugin.
+
+    The new module code is imported before the old plugin is removed, so a
+    module which fails to import leaves the old plugin in place.  The
+    ``deltabot_init`` and ``deltabot_start`` hooks of the new plugin are
+    called, so it should only be used for a started bot.
+    """
+    old = bot.plugins.dict().get(os.path.basename(path))
+    saved = None
+    if old is not None:
+        saved = sys.modules.pop(old.__name__, None)
+    importlib.invalidate_caches()
+    try:
+        mod = py.path.local(path).pyimport()
+    except Exception:
+        if saved is not None:
+            sys.modules[old.__name__] = saved
+        raise
+    if old is not None:
+        unload_module(bot, path)
+    before = bot.plugins.dict()
+    bot.plugins.add_module(name=os.path.basename(path), module=mod)
+    new_plugins = [plugin for name, plugin in bot.plugins.items() if name not in before]
+    _call_hook_for(bot.plugins._pm, "deltabot_start", new_plugins, bot=bot)
+    return mod
+
+
+def _is_defined_in(plugin, module):
+    return not inspect.ismodule(plugin) and type(plugin).__module__ == module.__name__
+
+
+def _call_hook_for(pm, hook_name, plugins, **kwargs):
+    """ call a hook only for the given plugins. """
+    others = [p for p in pm.get_plugins() if not any(p is plugin for plugin in plugins)]
+    return pm.subset_hook_caller(hook_name, remove_plugins=others)(**kwargs)
+
+
+class ModuleReloader:
+    """ watch the modules added with "deltabot add-module" and reload changed ones.
+
+    Every interval seconds the modification times of the module files are
+    compared.  Changed modules are reloaded in-process, modules which were
+    added or deleted meanwhile are loaded or unloaded.  Messages which are
+    processed during a reload may not see the module's commands and filters.
+    """
+    def __init__(self, bot, interval=1.0):
+        self.bot = bot
+        self.logger = bot.logger
+        self.interval = interval
+        self._stamps = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        for path in get_module_paths(self.bot):
+            self._stamps[path] = self._get_stamp(path)
+        self.logger.info("watching {} module(s) for changes".format(len(self._stamps)))
+        self._thread = t = threading.Thread(target=self._watch, name="bot-module-reloader")
+        t.setDaemon(1)
+        t.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def _get_stamp(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as ex:
+                self.logger.exception("checking modules for changes failed: {}".format(ex))
+
+    def check(self):
+        """ reload, load or unload modules, return the paths of handled modules. """
+        handled = []
+        paths = get_module_paths(self.bot)
+        for path in list(self._stamps):
+            if path not in paths:
+                self.logger.info("unloading removed module {}".format(path))
+                unload_module(self.bot, path)
+                del self._stamps[path]
+                handled.append(path)
+        for path in paths:
+            stamp = self._get_stamp(path)
+            if stamp is None:
+                # keep the module, editors may replace files on save
+                continue
+            if path in self._stamps and self._stamps[path] == stamp:
+                continue
+            self.logger.info("reloading module {}".format(path))
+            try:
+                reload_module(self.bot, path)
+            except Exception as ex:
+                self.logger.exception("reloading module {} failed: {}".format(path, ex))
+            self._stamps[path] = stamp
+            handled.append(path)
+        return handled
@@ -0,0 +1,184 @@
+from .cache import LRUCache
+from .plugins import Plugins
+
+_notcached = object()
+
+
+class BotSettings:
+    """ persistent scoped-key/value settings of a bot.
+
+    The settings are stored by the plugins implementing the settings hooks,
+    see :mod:`deltabot.hookspec`.  Subclasses need to provide the ``plugins``
+    and ``settings_cache`` attributes.
+    """
+
+    def set(self, name, value, scope="global"):
+        """ Store a bot setting with the given scope. """
+        assert "/" not in scope and "/" not in name
+        key = scope + "/" + name
+        self.plugins._pm.hook.deltabot_store_setting(key=key, value=value)
+        if self.settings_cache is not None:
+            self.settings_cache.put(key, value)
+
+    def delete(self, name, scope="global"):
+        """ Delete a bot setting with the given scope. """
+        assert "/" not in scope
+        key = scope + "/" + name
+        self.plugins._pm.hook.deltabot_store_setting(key=key, value=None)
+        if self.settings_cache is not None:
+            self.settings_cache.put(key, None)
+
+    def get(self, name, default=None, scope="global"):
+        """ Get a bot setting from the given scope. """
+        assert "/" not in scope
+        key = scope + "/" + name
+        cache = self.settings_cache
+        if cache is None:
+            res = self.plugins._pm.hook.deltabot_get_setting(key=key)
+        else:
+            res = cache.get(key, _notcached)
+            if res is _notcached:
+                res = self.plugins._pm.hook.deltabot_get_setting(key=key)
+                # non-existing settings are cached as None
+                cache.setdefault(key, res)
+        return res if res is not None else default
+
+    def set_many(self, settings, scope="global"):
+        """ Store many bot settings with the given scope in one transaction.
+
+        :param settings: dict or iterable of (name, value) tuples.
+                         A value of None deletes the setting.
+        """
+        assert "/" not in scope
+        keyed = []
+        for name, value in dict(settings).items():
+            assert "/" not in name
+            keyed.append((scope + "/" + name, value))
+        store_settings = self._get_bulk_hook("deltabot_store_setting", "deltabot_store_settings")
+        if store_settings is None or not store_settings(items=keyed):
+            for key, value in keyed:
+                self.plugins._pm.hook.deltabot_store_setting(key=key, value=value)
+        if self.settings_cache is not None:
+            for key, value in keyed:
+                self.settings_cache.put(key, value)
+
+    def _get_bulk_hook(self, single_name, bulk_name):
+        """ return the bulk settings hook or None if the plugin which stores
+        single settings does not implement it.
+
+        Storage plugins which only implement the single setting hooks take
+        precedence over the bulk hooks of the builtin database, otherwise
+        bulk operations would go to a different storage.
+        """
+        hook = self.plugins._pm.hook
+        # hookimpls are called from the end of the list
+        single_impls = getattr(hook, single_name).get_hookimpls()
+        bulk_impls = getattr(hook, bulk_name).get_hookimpls()
+        if not single_impls or not bulk_impls or \
+                single_impls[-1].plugin is not bulk_impls[-1].plugin:
+            return None
+        return getattr(hook, bulk_name)
+
+    def delete_many(self, names, scope="global"):
+        """ Delete many bot settings with the given scope in one transaction. """
+        self.set_many(((name, None) for name in names), scope=scope)
+
+    def get_many(self, names, default=None, scope="global"):
+        """ Get many bot settings from the given scope at once.
+
+        :returns: dict mapping each name to its value or default.
+        """
+        assert "/" not in scope
+        scope_prefix = scope + "/"
+        values = {}
+        missing = []
+        cache = self.settings_cache
+        for name in names:
+            key = scope_prefix + name
+            value = _notcached if cache is None else cache.get(key, _notcached)
+            if value is _notcached:
+                missing.append(key)
+            else:
+                values[key] = value
+        if missing:
+            get_settings = self._get_bulk_hook("deltabot_get_setting", "deltabot_get_settings")
+            found = None if get_settings is None else get_settings(keys=missing)
+            if found is None:
+                found = {}
+                for key in missing:
+                    found[key] = self.plugins._pm.hook.deltabot_get_setting(key=key)
+            for key in missing:
+                value = found.get(key)
+                values[key] = value
+                if cache is not None:
+                    cache.setdefault(key, value)
+        return dict((key[len(scope_prefix):], value if value is not None else default)
+                    for key, value in values.items())
+
+    def list_settings(self, scope=None):
+        """ list bot settings for the given scope.
+
+        If scope is not specified, all settings are returned.
+        """
+        return list(self.iter_settings(scope))
+
+    def iter_settings(self, scope=None):
+        """ iterate over (name, value) bot settings of the given scope.
+
+        Storage plugins may stream the results so this does not need
+        to hold all settings in memory.
+        If scope is not specified, all settings are returned with their
+        scoped keys as names.
+        """
+        assert scope is None or "/" not in scope
+        settings = self.plugins._pm.hook.deltabot_list_settings(scope=scope)
+        if scope is None:
+            yield from settings
+            return
+        scope_prefix = scope + "/"
+        for key, value in settings:
+            # storage plugins may ignore the scope and return all settings
+            if key.startswith(scope_prefix):
+                yield key[len(scope_prefix):], value
+
+    def enable_settings_cache(self, maxsize):
+        """ keep up to maxsize recently used settings in memory.
+
+        Reads of cached settings don't call the settings hooks anymore.
+        The cache is kept up to date by :meth:`set` and :meth:`delete` but
+        does not see changes made by other processes, e.g. ``deltabot db_set``.
+        """
+        self.settings_cache = LRUCache(maxsize)
+
+    def preload_settings_cache(self):
+        """ fill the settings cache with stored settings up to its size. """
+        cache = self.settings_cache
+        for key, value in self.iter_settings():
+            if len(cache) >= cache.maxsize:
+                break
+            cache.setdefault(key, value)
+
+
+class SettingsBot(BotSettings):
+    """ bot without a Delta Chat account for subcommands which only need
+    plugins and settings.
+
+    Only the ``deltabot_init_settings`` hook is called, so everything
+    which plugins set up in ``deltabot_init``, e.g. commands and filters,
+    is not available.  See ``settings_only`` in
+    :meth:`deltabot.parser.MyArgumentParser.add_subcommand`.
+    """
+    def __init__(self, basedir, logger, plugin_manager, args=()):
+        #: directory of the bot's account and settings database
+        self.basedir = basedir
+
+        self.logger = logger
+
+        self.settings_cache = None
+
+        #: plugin subsystem for adding/removing plugins and calling plugin hooks
+        #: see :class:`deltabot.plugins.Plugins`
+        self.plugins = Plugins(logger=logger, plugin_manager=plugin_manager)
+
+        plugin_manager.hook.deltabot_init_settings.call_historic(
+            kwargs=dict(bot=self, args=args))
@@ -0,0 +1,69 @@
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupReport:
+    """ durations of the phases of starting up a bot.
+
+    Every timing is recorded as a (phase, name, seconds) tuple, e.g.
+    ("deltabot_init", "myplugin", 0.4).  Phases may be nested, e.g. the
+    ``deltabot_init`` hookimpls are timed as part of ``DeltaBot.__init__``.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = []
+        self._lock = threading.Lock()
+
+    def add(self, phase, name, seconds):
+        with self._lock:
+            self.timings.append((phase, name, seconds))
+
+    @contextmanager
+    def timed(self, phase, name=""):
+        """ context manager recording the duration of its block. """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, name, time.perf_counter() - start)
+
+    @contextmanager
+    def timed_hookimpls(self, pm, hook_name):
+        """ context manager recording the duration of every implementation
+        of the hook which is called in its block.
+
+        Hook wrappers are not timed.  Plugins which register during the
+        block are not timed either, their time counts to the phase which
+        registers them.
+        """
+        impls = getattr(pm.hook, hook_name).get_hookimpls()
+        originals = [impl.function for impl in impls]
+        for impl in impls:
+            if not inspect.isgeneratorfunction(impl.function):
+                impl.function = self._make_timed(impl.function, hook_name, impl.plugin_name)
+        try:
+            yield
+        finally:
+            for impl, function in zip(impls, originals):
+                impl.function = function
+
+    def _make_timed(self, function, phase, name):
+        @functools.wraps(function)
+        def timed(*args):
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                self.add(phase, name, time.perf_counter() - start)
+        return timed
+
+    def format_lines(self):
+        """ return report lines with the slowest phases first. """
+        total = time.perf_counter() - self.started
+        lines = ["startup took {:.1f}ms, slowest phases first:".format(total * 1000)]
+        for phase, name, seconds in sorted(self.timings, key=lambda x: -x[2]):
+            lines.append("{:10.1f}ms  {:25s} {}".format(seconds * 1000, phase, name))
+        return lines
@@ -0,0 +1,211 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+
+class Histogram:
+    """ latency histogram with fixed buckets, values are in seconds. """
+
+    #: upper bounds of the buckets, the last bucket catches everything else
+    bounds = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+              1.0, 2.5, 5.0, 10.0, float("inf"))
+
+    def __init__(self):
+        self.counts = [0] * len(self.bounds)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """ return the upper bucket bound below which a fraction q of values lie. """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.bounds[-1]
+
+    def to_dict(self):
+        return dict(counts=list(self.counts), count=self.count, sum=self.sum)
+
+    @classmethod
+    def from_dict(cls, d):
+        hist = cls()
+        hist.counts = list(d["counts"])
+        hist.count = d["count"]
+        hist.sum = d["sum"]
+        return hist
+
+
+class HandlerStats:
+    """ call count, error count and latencies of a single handler. """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency = Histogram()
+
+    def to_dict(self):
+        return dict(calls=self.calls, errors=self.errors, latency=self.latency.to_dict())
+
+    @classmethod
+    def from_dict(cls, d):
+        handler_stats = cls()
+        handler_stats.calls = d["calls"]
+        handler_stats.errors = d["errors"]
+        handler_stats.latency = Histogram.from_dict(d["latency"])
+        return handler_stats
+
+
+class Stats:
+    """ thread-safe recorder of handler statistics of a running bot.
+
+    Handlers are identified by a kind ("hook", "command", "filter")
+    and their name.  Use :meth:`start` and :meth:`record` around a call.
+    Named event counters are increased with :meth:`incr`.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        #: incremented with every recorded call or counter change
+        self.version = 0
+        self._handlers = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name, value=1):
+        """ increase the named event counter. """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+            self.version += 1
+
+    def get_counter(self, name):
+        return self._counters.get(name, 0)
+
+    def start(self):
+        """ return a start time for a later :meth:`record` call. """
+        return time.perf_counter()
+
+    def record(self, kind, name, start, error=False):
+        """ record a finished handler call which began at start. """
+        duration = time.perf_counter() - start
+        key = (kind, name)
+        with self._lock:
+            handler_stats = self._handlers.get(key)
+            if handler_stats is None:
+                handler_stats = self._handlers[key] = HandlerStats()
+            handler_stats.calls += 1
+            if error:
+                handler_stats.errors += 1
+            handler_stats.latency.observe(duration)
+            self.version += 1
+
+    async def record_async(self, kind, name, start, coro):
+        """ await coro and record it as a handler call which began at start. """
+        try:
+            res = await coro
+        except Exception:
+            self.record(kind, name, start, error=True)
+            raise
+        self.record(kind, name, start)
+        return res
+
+    def call_hook(self, hookcaller, kwargs):
+        """ call a firstresult hook and record statistics for each hookimpl.
+
+        Hooks with hookwrappers are called normally and recorded as a whole.
+        """
+        impls = hookcaller.get_hookimpls()
+        if any(getattr(impl, "hookwrapper", False) or getattr(impl, "wrapper", False)
+               for impl in impls):
+            start = self.start()
+            try:
+                return hookcaller(**kwargs)
+            finally:
+                self.record("hook", hookcaller.name, start)
+
+        # pluggy calls the last registered hookimpls first
+        for impl in reversed(impls):
+            args = [kwargs[argname] for argname in impl.argnames]
+            name = "{}:{}".format(hookcaller.name, impl.plugin_name)
+            start = self.start()
+            try:
+                res = impl.function(*args)
+            except Exception:
+                self.record("hook", name, start, error=True)
+                raise
+            self.record("hook", name, start)
+            if res is not None:
+                return res
+
+    def snapshot(self):
+        """ return a json-serializable snapshot of all statistics. """
+        with self._lock:
+            handlers = [[kind, name, handler_stats.to_dict()]
+                        for (kind, name), handler_stats in sorted(self._handlers.items())]
+            counters = dict(self._counters)
+        return dict(started=self.started, time=time.time(),
+                    handlers=handlers, counters=counters)
+
+    def save(self, path):
+        """ atomically write a snapshot as json to path. """
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+
+def get_stats_path(bot):
+    """ return the path where the statistics of a serving bot are saved. """
+    return os.path.join(bot.basedir, "stats.json")
+
+
+def load_snapshot(path):
+    """ return the snapshot saved at path by :meth:`Stats.save` or None. """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def format_snapshot(snapshot):
+    """ return text lines describing a :meth:`Stats.snapshot`. """
+    lines = ["stats since {} (taken {})".format(
+        time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(snapshot["started"])),
+        time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(snapshot["time"])))]
+    for name, value in sorted(snapshot.get("counters", {}).items()):
+        lines.append("{}: {}".format(name, value))
+    if not snapshot["handlers"]:
+        lines.append("no handler calls recorded")
+    for kind, name, d in snapshot["handlers"]:
+        handler_stats = HandlerStats.from_dict(d)
+        hist = handler_stats.latency
+        mean = hist.sum / hist.count if hist.count else 0.0
+        lines.append("{} {}: calls={} errors={} mean={} p50<={} p95<={} p99<={}".format(
+            kind, name, handler_stats.calls, handler_stats.errors,
+            format_duration(mean), format_duration(hist.quantile(0.5)),
+            format_duration(hist.quantile(0.95)), format_duration(hist.quantile(0.99))))
+    return lines
+
+
+def percentile(sorted_values, q):
+    """ return the value below which a fraction q of the sorted values lie. """
+    if not sorted_values:
+        return 0.0
+    index = int(round(q * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def format_duration(seconds):
+    if seconds == float("inf"):
+        return "inf"
+    return "{:.1f}ms".format(seconds * 1000)
@@ -0,0 +1,202 @@
+import json
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+from .stats import load_snapshot
+
+
+def shard_basedirs(basedirs, num_shards):
+    """ distribute basedirs round-robin over at most num_shards non-empty lists. """
+    shards = [basedirs[i::num_shards] for i in range(num_shards)]
+    return [shard for shard in shards if shard]
+
+
+def worker_main(basedirs, args):
+    """ serve the bots in basedirs until SIGTERM, run in a worker process. """
+    from .multi import BotGroup
+
+    # the supervisor shuts workers down, also on ctrl-c in a terminal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    group = BotGroup(basedirs, args)
+
+    def shutdown(signum, frame):
+        for bot in group.bots:
+            bot.trigger_shutdown()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    group.start(workers=args.workers, senders=args.senders, queue_size=args.queue_size)
+    group.wait_shutdown()
+
+
+class WorkerProcess:
+    """ state of a supervised worker process and its bots. """
+    def __init__(self, index, basedirs):
+        self.index = index
+        self.basedirs = basedirs
+        self.process = None
+        self.started = None
+        self.restarts = 0
+        #: seconds to wait before restarting after the next crash
+        self.backoff = 1.0
+        #: time when a crashed worker may be restarted
+        self.restart_at = None
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+
+class Supervisor:
+    """ shard bots across worker processes and restart crashed workers.
+
+    Every worker process serves its bots with a
+    :class:`deltabot.multi.BotGroup`, so CPU heavy plugins of different
+    workers run in parallel.  Workers are started with the "spawn" method
+    and do not inherit threads or deltachat state of the supervisor.
+    A worker which exits is restarted after a backoff which doubles with
+    every crash shortly after starting, up to max_backoff seconds.
+
+    The health of the workers and the summed counters of their bots, as
+    saved by the bots into ``stats.json`` files, are available from
+    :meth:`status`.
+    """
+
+    #: a worker running this many seconds resets its restart backoff
+    min_uptime = 60.0
+    max_backoff = 60.0
+
+    def __init__(self, basedirs, args, logger, num_processes, target=worker_main):
+        self.args = args
+        self.logger = logger
+        self.target = target
+        self.workers = [WorkerProcess(i, shard)
+                        for i, shard in enumerate(shard_basedirs(basedirs, num_processes))]
+        self._context = multiprocessing.get_context("spawn")
+        self._stop = threading.Event()
+        self._last_counters = {}
+        self._last_status = None
+
+    def start(self):
+        for worker in self.workers:
+            self._start_worker(worker)
+
+    def _start_worker(self, worker):
+        worker.process = self._context.Process(
+            target=self.target, args=(worker.basedirs, self.args),
+            name="deltabot-worker-{}".format(worker.index))
+        worker.process.start()
+        worker.started = time.time()
+        worker.restart_at = None
+        self.logger.info("started worker {} pid={} for {} bot(s)".format(
+            worker.index, worker.process.pid, len(worker.basedirs)))
+
+    def check(self, now=None):
+        """ restart exited workers whose backoff passed, return the restarted ones. """
+        if now is None:
+            now = time.time()
+        restarted = []
+        for worker in self.workers:
+            if worker.process is None or worker.is_alive():
+                continue
+            if worker.restart_at is None:
+                if now - worker.started >= self.min_uptime:
+                    worker.backoff = 1.0
+                worker.restart_at = now + worker.backoff
+                self.logger.warning("worker {} pid={} exited with {}, restarting in {:.0f}s".format(
+                    worker.index, worker.process.pid, worker.process.exitcode, worker.backoff))
+                worker.backoff = min(worker.backoff * 2, self.max_backoff)
+            if now >= worker.restart_at:
+                worker.restarts += 1
+                self._start_worker(worker)
+                restarted.append(worker)
+        return restarted
+
+    def stop(self):
+        """ let :meth:`run` return, may be called from a signal handler. """
+        self._stop.set()
+
+    def terminate_workers(self, timeout=10):
+        """ shut down all workers, killing those which don't exit within timeout. """
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.process.terminate()
+        deadline = time.time() + timeout
+        for worker in self.workers:
+            if worker.process is None:
+                continue
+            worker.process.join(max(0, deadline - time.time()))
+            if worker.process.is_alive():
+                self.logger.warning("killing worker {} pid={}".format(
+                    worker.index, worker.process.pid))
+                worker.process.kill()
+                worker.process.join()
+
+    def status(self, now=None):
+        """ return a json-serializable dict with worker health and bot counters.
+
+        ``rates`` holds the per-second increase of every counter since the
+        previous call.  Counters of restarted bots start again from zero.
+        """
+        if now is None:
+            now = time.time()
+        counters = {}
+        increases = {}
+        for worker in self.workers:
+            for basedir in worker.basedirs:
+                snapshot = load_snapshot(os.path.join(basedir, "stats.json"))
+                if snapshot is None:
+                    continue
+                last_started, last_counters = self._last_counters.get(basedir, (None, {}))
+                if snapshot["started"] != last_started:
+                    last_counters = {}
+                for name, value in snapshot["counters"].items():
+                    increase = max(0, value - last_counters.get(name, 0))
+                    counters[name] = counters.get(name, 0) + value
+                    increases[name] = increases.get(name, 0) + increase
+                self._last_counters[basedir] = (snapshot["started"], snapshot["counters"])
+        rates = {}
+        if self._last_status is not None and now > self._last_status:
+            rates = dict((name, value / (now - self._last_status))
+                         for name, value in increases.items())
+        self._last_status = now
+        workers = [dict(index=worker.index, alive=worker.is_alive(),
+                        pid=worker.process.pid if worker.process is not None else None,
+                        restarts=worker.restarts, bots=len(worker.basedirs))
+                   for worker in self.workers]
+        return dict(time=now, workers=workers, counters=counters, rates=rates)
+
+    def run(self, status_interval=30.0, status_path=None):
+        """ start and supervise the workers until :meth:`stop` is called.
+
+        Every status_interval seconds the status is logged and written
+        as json to status_path if given.  The workers are terminated
+        when returning.
+        """
+        self.start()
+        try:
+            last_status = time.time()
+            while not self._stop.wait(1.0):
+                self.check()
+                if time.time() - last_status >= status_interval:
+                    last_status = time.time()
+                    status = self.status()
+                    self.logger.info(format_status(status))
+                    if status_path is not None:
+                        tmp_path = status_path + ".tmp"
+                        with open(tmp_path, "w") as f:
+                            json.dump(status, f)
+                        os.replace(tmp_path, status_path)
+        finally:
+            self.terminate_workers()
+
+
+def format_status(status):
+    """ return a one-line summary of a :meth:`Supervisor.status`. """
+    workers = status["workers"]
+    return "{}/{} workers alive, {} restarts, {} bots, {} processed ({:.1f}/s)".format(
+        sum(1 for w in workers if w["alive"]), len(workers),
+        sum(w["restarts"] for w in workers), sum(w["bots"] for w in workers),
+        status["counters"].get("messages_processed", 0),
+        status["rates"].get("messages_processed", 0.0))
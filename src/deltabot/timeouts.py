@@ -0,0 +1,127 @@
+import asyncio
+import functools
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+
+class HandlerTimeout(Exception):
+    """ a command or filter handler did not finish within its timeout. """
+
+
+class HandlerTimeouts:
+    """ deadlines for command and filter handlers.
+
+    A synchronous handler with a timeout runs in a thread of a pool.  If it
+    does not finish in time, message processing goes on without it: the
+    sender gets the :attr:`still_working` reply and the replies of the
+    handler are sent by its thread when it finishes.  A filter which
+    timed out stops the filter chain, as it may still handle the message.
+    Asynchronous handlers are cancelled when they time out and the sender
+    gets the :attr:`cancelled` reply.
+
+    :param default: timeout in seconds for handlers registered without
+                    one, or None for no timeout.
+    :param max_threads: maximum number of threads running synchronous
+                        handlers, including abandoned ones.
+    :param executor: executor shared with other bots, used instead of an
+                     own thread pool.  It is not shut down by :meth:`shutdown`.
+    """
+
+    #: reply when a handler takes longer than its timeout and continues in the background
+    still_working = "This takes longer than expected, the answer will follow."
+
+    #: reply when a handler was cancelled or could not be started in time
+    cancelled = "Sorry, this took too long and was cancelled."
+
+    def __init__(self, bot, default=None, max_threads=32, executor=None):
+        self.bot = bot
+        self.logger = bot.logger
+        self.default = default
+        self.max_threads = max_threads
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._lock = threading.Lock()
+
+    def get_timeout(self, timeout):
+        """ return the effective timeout of a handler registered with timeout. """
+        return self.default if timeout is None else timeout
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_threads,
+                                                    thread_name_prefix="bot-handler")
+            return self._executor
+
+    def shutdown(self):
+        """ stop the handler threads without waiting for abandoned handlers. """
+        with self._lock:
+            if self._owns_executor and self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def call(self, func, kwargs, replies, timeout, kind, name, start):
+        """ return func(replies=replies, **kwargs), giving up after the timeout.
+
+        Without a timeout or if func is an ``async def`` function, func is
+        called directly.  Otherwise it runs in a handler thread with its
+        own replies which are added to replies if it finishes in time.
+        Exceptions of func are raised as usual.
+
+        :param start: :meth:`deltabot.stats.Stats.start` value, used for
+                      recording the statistics of late handlers.
+        :raises HandlerTimeout: if func did not finish in time.  Its call
+                                statistics are then recorded when it finishes.
+        """
+        timeout = self.get_timeout(timeout)
+        if timeout is None or inspect.iscoroutinefunction(func):
+            # the deadline of async handlers is enforced by :meth:`run_async`
+            return func(replies=replies, **kwargs)
+
+        handler_replies = type(replies)(replies.incoming_message, logger=replies.logger)
+        future = self._get_executor().submit(func, replies=handler_replies, **kwargs)
+        try:
+            res = future.result(timeout)
+        except TimeoutError:
+            if future.done():
+                # the handler itself raised a TimeoutError
+                raise
+            self.bot.stats.incr("handlers_timed_out")
+            if future.cancel():
+                self.logger.warning("{} {!r} could not start within {}s, cancelled".format(
+                    kind, name, timeout))
+                self.bot.stats.record(kind, name, start, error=True)
+                replies.add(text=self.cancelled)
+            else:
+                self.logger.warning("{} {!r} exceeded its timeout of {}s, "
+                                    "continuing in the background".format(kind, name, timeout))
+                replies.add(text=self.still_working)
+                future.add_done_callback(functools.partial(
+                    self._finish_late, handler_replies, kind, name, start))
+            raise HandlerTimeout("{} {!r} timed out after {}s".format(kind, name, timeout))
+        replies.extend(handler_replies)
+        return res
+
+    def _finish_late(self, replies, kind, name, start, future):
+        ex = future.exception()
+        if ex is not None:
+            self.logger.error("{} {!r} failed: {!r}".format(kind, name, ex))
+        self.bot.stats.record(kind, name, start, error=ex is not None)
+        self.logger.info("{} {!r} finished late, sending its replies".format(kind, name))
+        self.bot._sender.submit(replies)
+
+    async def run_async(self, coro, replies, timeout, kind, name):
+        """ await coro, cancelling it after the timeout.
+
+        :raises HandlerTimeout: if coro was cancelled.
+        """
+        timeout = self.get_timeout(timeout)
+        if timeout is None:
+            return await coro
+        try:
+            return await asyncio.wait_for(coro, timeout)
+        except asyncio.TimeoutError:
+            self.bot.stats.incr("handlers_timed_out")
+            replies.add(text=self.cancelled)
+            raise HandlerTimeout("{} {!r} cancelled after {}s".format(kind, name, timeout))
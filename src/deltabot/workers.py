@@ -0,0 +1,203 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from queue import Full, Queue
+
+
+class ChatWorkerPool:
+    """ Pool of worker threads which process work items sharded by chat id.
+
+    All items submitted for the same chat are processed by the same
+    worker thread and thus in submission order, while items for
+    different chats are processed in parallel.  Chat ids may be any
+    hashable keys, e.g. (bot, chat id) tuples for pools shared by bots.
+    """
+    def __init__(self, num_workers, logger, name="bot-worker", maxsize=0):
+        if num_workers < 1:
+            raise ValueError("need at least one worker, got {!r}".format(num_workers))
+        self.logger = logger
+        self.name = name
+        self._queues = [Queue(maxsize) for i in range(num_workers)]
+        self._threads = []
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._queues)
+
+    def start(self):
+        self.logger.info("starting {} {} THREADS".format(len(self._queues), self.name))
+        for i, queue in enumerate(self._queues):
+            t = threading.Thread(target=self._worker, args=(queue,),
+                                 name="{}-{}".format(self.name, i))
+            t.setDaemon(1)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout=10):
+        for queue in self._queues:
+            queue.put(None)
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads[:] = []
+
+    def qsize(self):
+        """ return the number of work items waiting to be processed. """
+        return sum(queue.qsize() for queue in self._queues)
+
+    def submit(self, chat_id, func, *args, ident=None):
+        """ schedule func(*args) on the worker responsible for chat_id.
+
+        If ident is specified and an item with the same ident was submitted
+        before and has not finished processing, the item is not submitted
+        again and False is returned.
+        """
+        if ident is not None:
+            with self._pending_lock:
+                if ident in self._pending:
+                    return False
+                self._pending.add(ident)
+        self._queues[hash(chat_id) % len(self._queues)].put((func, args, ident))
+        return True
+
+    def _worker(self, queue):
+        while 1:
+            item = queue.get()
+            if item is None:
+                break
+            func, args, ident = item
+            try:
+                func(*args)
+            except Exception as ex:
+                self.logger.exception("worker {} failed: {}".format(
+                    threading.current_thread().name, ex))
+            finally:
+                if ident is not None:
+                    with self._pending_lock:
+                        self._pending.discard(ident)
+
+
+class PriorityWorkerPool:
+    """ Pool of worker threads which process work items by priority.
+
+    Work items wait in a single queue shared by all workers.  A worker
+    always takes the item with the lowest priority value, among chats not
+    being processed by another worker, so items of one chat are processed
+    one at a time in submission order while urgent chats overtake others.
+    Within a chat the priority of its oldest waiting item counts.
+
+    If maxsize is positive, at most maxsize items wait in the queue.
+    """
+    def __init__(self, num_workers, logger, name="bot-worker", maxsize=0):
+        if num_workers < 1:
+            raise ValueError("need at least one worker, got {!r}".format(num_workers))
+        self.logger = logger
+        self.name = name
+        self.num_workers = num_workers
+        self.maxsize = maxsize
+        self._cond = threading.Condition()
+        # chat_id -> deque of waiting (priority, seq, func, args, ident) items
+        self._chats = {}
+        # heap of (priority, seq, chat_id) of waiting chats which are not busy
+        self._ready = []
+        self._busy = set()
+        self._pending = set()
+        self._seq = itertools.count()
+        self._size = 0
+        self._running = False
+        self._threads = []
+
+    def __len__(self):
+        return self.num_workers
+
+    def start(self):
+        self.logger.info("starting {} {} THREADS".format(self.num_workers, self.name))
+        self._running = True
+        for i in range(self.num_workers):
+            t = threading.Thread(target=self._worker, name="{}-{}".format(self.name, i))
+            t.setDaemon(1)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout=10):
+        """ stop the workers after they processed the waiting items. """
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads[:] = []
+
+    def qsize(self):
+        """ return the number of work items waiting to be processed. """
+        return self._size
+
+    def wait_for_space(self, timeout=None):
+        """ wait until the queue is not full, return False on timeout. """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self.maxsize or self._size < self.maxsize or not self._running,
+                timeout)
+
+    def submit(self, chat_id, func, *args, ident=None, priority=0, block=True, timeout=None):
+        """ schedule func(*args) for chat_id with the given priority.
+
+        If ident is specified and an item with the same ident was submitted
+        before and has not finished processing, the item is not submitted
+        again and False is returned.  If the queue is full, wait for space
+        or raise :class:`queue.Full` if block is False or after timeout
+        seconds.
+        """
+        with self._cond:
+            if ident is not None and ident in self._pending:
+                return False
+            if self.maxsize:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while self._size >= self.maxsize:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if not block or (remaining is not None and remaining <= 0):
+                        raise Full()
+                    self._cond.wait(remaining)
+            if ident is not None:
+                self._pending.add(ident)
+            item = (priority, next(self._seq), func, args, ident)
+            queue = self._chats.get(chat_id)
+            if queue is None:
+                queue = self._chats[chat_id] = deque()
+                if chat_id not in self._busy:
+                    heapq.heappush(self._ready, (priority, item[1], chat_id))
+            queue.append(item)
+            self._size += 1
+            self._cond.notify_all()
+        return True
+
+    def _worker(self):
+        while 1:
+            with self._cond:
+                while not self._ready and self._running:
+                    self._cond.wait()
+                if not self._ready:
+                    break
+                chat_id = heapq.heappop(self._ready)[2]
+                queue = self._chats[chat_id]
+                priority, seq, func, args, ident = queue.popleft()
+                if not queue:
+                    del self._chats[chat_id]
+                self._busy.add(chat_id)
+                self._size -= 1
+                self._cond.notify_all()
+            try:
+                func(*args)
+            except Exception as ex:
+                self.logger.exception("worker {} failed: {}".format(
+                    threading.current_thread().name, ex))
+            finally:
+                with self._cond:
+                    self._busy.discard(chat_id)
+                    self._pending.discard(ident)
+                    queue = self._chats.get(chat_id)
+                    if queue:
+                        heapq.heappush(self._ready, (queue[0][0], queue[0][1], chat_id))
+                    self._cond.notify_all()
@@ -0,0 +1,40 @@
+import pytest
+
+from deltabot.cache import LRUCache
+
+
+def test_invalid_maxsize():
+    with pytest.raises(ValueError):
+        LRUCache(0)
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_setdefault_does_not_overwrite():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.setdefault("a", 0)
+    assert cache.get("a") == 1
+    cache.setdefault("b", None)
+    assert "b" in cache
+    assert cache.get("b", 5) is None
+
+
+def test_pop_clear():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    assert cache.pop("a") == 1
+    assert cache.pop("a") is None
+    cache.put("a", 1)
+    cache.clear()
+    assert len(cache) == 0
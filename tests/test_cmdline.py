@@ -17,6 +17,13 @@ def test_version(cmd):
     """.format(deltabot_version))
 
 
+def test_version_fast_path(capsys):
+    from deltabot import __version__ as deltabot_version
+    from deltabot.main import main
+    main(["deltabot", "--version"])
+    assert capsys.readouterr().out.strip() == deltabot_version
+
+
 class TestSettings:
     def test_get_set_list(self, mycmd, session_liveconfig):
         mycmd.run_fail(["db_get", "hello"])
@@ -86,3 +93,30 @@ class TestPluginManagement:
         """)
         out = mycmd.run_ok(["list-plugins"])
         assert "mycalc.py" not in out
+
+
+class TestBench:
+    def test_bench_json(self, mycmd, examples):
+        import json
+        path = examples.join("mycalc.py").strpath
+        mycmd.run_ok(["add-module", path])
+        out = mycmd.run_ok(["bench", "-n", "30", "--warmup", "2", "--json",
+                            "--command", "/mycalc 1+1", "--attachment-ratio", "0.5"])
+        results = json.loads(out[out.index("{"):])
+        assert results["messages"] == 30
+        assert results["errors"] == 0
+        assert results["throughput"] > 0
+        assert results["latency"]["p50"] <= results["latency"]["p99"]
+        assert results["config"]["commands"] == ["/mycalc 1+1"]
+
+    def test_bench_text(self, mycmd):
+        mycmd.run_ok(["bench", "-n", "10"], """
+            *processed 10 messages*
+            *throughput*
+            *latency*p50*p95*p99*
+        """)
+
+    def test_bench_bad_ratio(self, mycmd):
+        mycmd.run_fail(["bench", "--group-ratio", "2"], """
+            *ratios*
+        """)
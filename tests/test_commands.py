@@ -1,3 +1,4 @@
+import asyncio
 
 import pytest
 
@@ -117,3 +118,51 @@ class TestArgParsing:
     def test_two_commands_with_same_prefix(self, parse_cmd, mock_bot):
         assert parse_cmd("/execute", "/execute").cmd_def.cmd == "/execute"
         assert parse_cmd("/exec", "/exec").cmd_def.cmd == "/exec"
+
+    def test_unregister_frees_prefix(self, parse_cmd, mock_bot):
+        parse_cmd("/some_group", "/some_group")
+        mock_bot.commands.unregister("/some_group")
+        command = parse_cmd("/some", "/some_group")
+        assert command.args == ["group"]
+
+    def test_many_generated_commands(self, parse_cmd, mock_bot):
+        def my_command(command, replies):
+            """ my commands example. """
+
+        for i in range(1000):
+            mock_bot.commands.register(name="/join_{}".format(i), func=my_command)
+        with pytest.raises(ValueError):
+            mock_bot.commands.register(name="/join", func=my_command)
+        command = parse_cmd("/join_x", "/join_500_x hello")
+        assert command is None
+        mock_bot.commands.unregister("/join_500")
+        command = parse_cmd("/join_500", "/join_500_x hello")
+        assert command.args == ["x", "hello"]
+        assert command.payload == "x hello"
+
+
+def test_async_command(mock_bot, mocker):
+    async def my_command(command, replies):
+        """ my async command example. """
+        await asyncio.sleep(0.01)
+        replies.add(text="async " + command.payload)
+
+    mock_bot.commands.register(name="/asyncexample", func=my_command)
+    reply = mocker.run_command("/asyncexample 42")
+    assert reply.text == "async 42"
+
+
+def test_async_command_pending(mock_bot, mocker):
+    async def my_command(command, replies):
+        """ my async command example. """
+        await asyncio.sleep(0.1)
+        replies.add(text="done")
+
+    mock_bot.commands.register(name="/asyncexample", func=my_command)
+    msg = mocker.make_incoming_message("/asyncexample")
+    replies = Replies(msg, mock_bot.logger)
+    mock_bot.commands.deltabot_incoming_message(message=msg, replies=replies)
+    assert replies.has_pending()
+    l = replies.send_reply_messages()
+    assert not replies.has_pending()
+    assert len(l) == 1 and l[0].text == "done"
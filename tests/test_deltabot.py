@@ -1,9 +1,13 @@
 
 import io
+import os
+from queue import Queue
 
 import pytest
 
-from deltabot.bot import Replies
+from deltabot import deltabot_hookimpl
+from deltabot.bot import CheckAll, Replies, ReplySender
+from deltabot import bot as botmod
 
 
 class TestDeltaBot:
@@ -52,6 +56,123 @@ class TestSettings:
         assert len(l) == 2
         assert l == [("global/a", "1"), ("global/b", "2")]
 
+    @pytest.mark.parametrize("cache", [False, True])
+    def test_get_set_delete_many(self, mock_bot, cache):
+        if cache:
+            mock_bot.enable_settings_cache(10)
+        mock_bot.set_many({"a": "1", "b": "2", "c": "3"}, scope="x")
+        assert mock_bot.get("b", scope="x") == "2"
+        assert mock_bot.get_many(["a", "b", "d"], scope="x") == {"a": "1", "b": "2", "d": None}
+        mock_bot.delete_many(["a", "b"], scope="x")
+        assert mock_bot.get_many(["a", "c"], default="", scope="x") == {"a": "", "c": "3"}
+        assert mock_bot.list_settings(scope="x") == [("c", "3")]
+
+    def test_many_with_single_key_storage(self, mock_bot):
+        class DictStorage:
+            def __init__(self):
+                self.settings = {}
+
+            @deltabot_hookimpl
+            def deltabot_store_setting(self, key, value):
+                if value is None:
+                    self.settings.pop(key, None)
+                else:
+                    self.settings[key] = value
+                return True
+
+            @deltabot_hookimpl
+            def deltabot_get_setting(self, key):
+                return self.settings.get(key)
+
+        storage = DictStorage()
+        mock_bot.plugins.add_module("dictstorage", storage)
+        mock_bot.set_many({"a": "1", "b": "2"}, scope="x")
+        assert storage.settings == {"x/a": "1", "x/b": "2"}
+        assert mock_bot.get_many(["a", "b"], scope="x") == {"a": "1", "b": "2"}
+        mock_bot.delete_many(["a"], scope="x")
+        assert storage.settings == {"x/b": "2"}
+
+    def test_list_scoped(self, mock_bot):
+        mock_bot.set("a", "1", scope="x@example.org")
+        mock_bot.set("a", "2", scope="x@example.org0")
+        mock_bot.set("b", "3")
+        assert mock_bot.list_settings(scope="x@example.org") == [("a", "1")]
+        assert list(mock_bot.iter_settings(scope="global")) == [("b", "3")]
+
+    def test_cache_write_through(self, mock_bot):
+        mock_bot.set("a", "1")
+        mock_bot.enable_settings_cache(10)
+        mock_bot.preload_settings_cache()
+        assert "global/a" in mock_bot.settings_cache
+        mock_bot.set("a", "2")
+        assert mock_bot.get("a") == "2"
+        mock_bot.delete("a")
+        assert mock_bot.get("a", "default") == "default"
+        assert mock_bot.get("b") is None
+        assert "global/b" in mock_bot.settings_cache
+        mock_bot.set("b", "3")
+        assert mock_bot.get("b") == "3"
+        assert mock_bot.list_settings() == [("global/b", "3")]
+
+
+class TestCheckAll:
+    def test_get_priority(self, mock_bot, mocker):
+        checkall = CheckAll(mock_bot)
+        assert checkall.get_priority(mocker.make_incoming_message("hi")) == botmod.PRIORITY_SINGLE
+        msg = mocker.make_incoming_message("hi", group=True)
+        assert checkall.get_priority(msg) == botmod.PRIORITY_GROUP
+        msg = mocker.make_incoming_message("/help", group=True)
+        assert checkall.get_priority(msg) == botmod.PRIORITY_GROUP_COMMAND
+        mock_bot.set("admins", "alice@example.org")
+        assert checkall.get_priority(msg) == botmod.PRIORITY_ADMIN
+
+    def test_perform_by_priority(self, mock_bot, mocker, monkeypatch):
+        msgs = [
+            mocker.make_incoming_message("g1", group=True),
+            mocker.make_incoming_message("s1"),
+            mocker.make_incoming_message("/help", group=True),
+            mocker.make_incoming_message("s2"),
+            mocker.make_incoming_message("a1", addr="admin@example.org"),
+        ]
+        mock_bot.set("admins", "admin@example.org")
+        monkeypatch.setattr(mock_bot.account, "get_fresh_messages", lambda: iter(msgs))
+        processed = []
+        checkall = CheckAll(mock_bot)
+        monkeypatch.setattr(checkall, "process_message", lambda msg: processed.append(msg.text))
+        assert checkall.perform()
+        assert processed == ["a1", "s1", "s2", "/help", "g1"]
+
+    def test_perform_keeps_chat_order(self, mock_bot, monkeypatch):
+        class FakeMessage:
+            def __init__(self, chat_id, text):
+                self.chat = type("FakeChat", (), dict(id=chat_id))()
+                self.text = text
+
+        priorities = {"/poll yes": botmod.PRIORITY_GROUP_COMMAND, "hi": botmod.PRIORITY_SINGLE}
+        msgs = [FakeMessage(1, "hello everyone"), FakeMessage(2, "other group"),
+                FakeMessage(1, "/poll yes"), FakeMessage(1, "thanks"), FakeMessage(3, "hi")]
+        monkeypatch.setattr(mock_bot.account, "get_fresh_messages", lambda: iter(msgs))
+        processed = []
+        checkall = CheckAll(mock_bot)
+        monkeypatch.setattr(checkall, "get_priority",
+                            lambda msg: priorities.get(msg.text, botmod.PRIORITY_GROUP))
+        monkeypatch.setattr(checkall, "process_message", lambda msg: processed.append(msg.text))
+        assert checkall.perform()
+        assert processed == ["hi", "hello everyone", "/poll yes", "thanks", "other group"]
+
+    def test_process_queued_skips_processed(self, mock_bot, mocker, monkeypatch):
+        msg = mocker.make_incoming_message("hi")
+        monkeypatch.setattr(mock_bot.account, "get_message_by_id", lambda msg_id: msg)
+        processed = []
+        checkall = CheckAll(mock_bot)
+        monkeypatch.setattr(checkall, "process_message", lambda msg: processed.append(msg.text))
+        monkeypatch.setattr(msg, "is_in_fresh", lambda: True)
+        checkall.process_queued(msg, botmod.PRIORITY_SINGLE, mock_bot.stats.start())
+        assert processed == ["hi"]
+        monkeypatch.setattr(msg, "is_in_fresh", lambda: False)
+        checkall.process_queued(msg, botmod.PRIORITY_SINGLE, mock_bot.stats.start())
+        assert processed == ["hi"]
+
 
 class TestReplies:
     @pytest.fixture
@@ -88,6 +209,22 @@ class TestReplies:
         assert "something" in l[0].filename
         s = open(l[0].filename, "rb").read()
         assert s == b"bytecontent"
+        blobdir = replies.incoming_message.account.get_blobdir()
+        assert os.path.dirname(l[0].filename) == blobdir.rstrip(os.sep)
+
+    def test_file_content_memoryview(self, replies):
+        replies.add(text="hello", filename="data.bin", bytefile=memoryview(b"x" * 100000))
+        l = replies.send_reply_messages()
+        assert len(l) == 1
+        assert l[0].filename.endswith(".bin")
+        s = open(l[0].filename, "rb").read()
+        assert s == b"x" * 100000
+
+    def test_bytefile_requires_basename(self, replies):
+        with pytest.raises(ValueError):
+            replies.add(filename="sub/data.bin", bytefile=b"")
+        with pytest.raises(ValueError):
+            replies.add(bytefile=b"")
 
     def test_chat_incoming_default(self, replies):
         replies.add(text="hello")
@@ -103,3 +240,51 @@ class TestReplies:
         assert len(l) == 1
         assert l[0].text == "this"
         assert l[0].chat.id == chat.id
+
+
+class TestReplySender:
+    @pytest.fixture
+    def results(self, mock_bot):
+        q = Queue()
+
+        class Plugin:
+            @deltabot_hookimpl
+            def deltabot_replies_sent(self, incoming_message, messages):
+                q.put((incoming_message, messages))
+
+            @deltabot_hookimpl
+            def deltabot_replies_failed(self, incoming_message, error):
+                q.put((incoming_message, error))
+
+        mock_bot.plugins.add_module("results", Plugin())
+        return q
+
+    @pytest.mark.parametrize("num_threads", [0, 2])
+    def test_send_reports_hook(self, mock_bot, mocker, results, num_threads):
+        sender = ReplySender(mock_bot)
+        sender.start(num_threads=num_threads)
+        try:
+            incoming_message = mocker.make_incoming_message("0")
+            replies = Replies(incoming_message, mock_bot.logger)
+            replies.add(text="hello")
+            sender.submit(replies)
+            msg, messages = results.get(timeout=10)
+        finally:
+            sender.stop()
+        assert msg == incoming_message
+        assert len(messages) == 1
+        assert messages[0].text == "hello"
+
+    def test_send_failure_reports_hook(self, mock_bot, mocker, results, monkeypatch):
+        def send_reply_messages(self):
+            raise ValueError("send failed")
+
+        monkeypatch.setattr(Replies, "send_reply_messages", send_reply_messages)
+        sender = ReplySender(mock_bot)
+        incoming_message = mocker.make_incoming_message("0")
+        replies = Replies(incoming_message, mock_bot.logger)
+        replies.add(text="hello")
+        sender.submit(replies)
+        msg, error = results.get(timeout=10)
+        assert msg == incoming_message
+        assert str(error) == "send failed"
@@ -1,6 +1,12 @@
 
+import asyncio
+import re
+
 import pytest
 
+from deltabot.bot import Replies
+from deltabot.filters import FilterDef, FilterIndex
+
 
 def hitchhiker(message, replies):
     """ my incoming message filter example. """
@@ -52,3 +58,151 @@ def test_pseudo_downloader(bot_tester):
     with open(msg_reply.filename) as f:
         content = f.read()
     assert content == open(__file__).read()
+
+
+def test_async_filter(mock_bot, mocker):
+    async def async_hitchhiker(message, replies):
+        """ my async incoming message filter example. """
+        await asyncio.sleep(0.01)
+        hitchhiker(message, replies)
+
+    mock_bot.filters.register(name="async_hitchhiker", func=async_hitchhiker)
+    msg = mocker.make_incoming_message("hello 42")
+    replies = Replies(msg, mock_bot.logger)
+    mock_bot.filters.deltabot_incoming_message(message=msg, replies=replies)
+    l = replies.send_reply_messages()
+    assert len(l) == 1
+    assert l[0].text == "correct answer!"
+
+
+class FakeChat:
+    def __init__(self, group):
+        self.group = group
+
+    def is_group(self):
+        return self.group
+
+
+class FakeContact:
+    def __init__(self, addr):
+        self.addr = addr
+
+
+class FakeMessage:
+    def __init__(self, text, group=False, filename="", view_type="text",
+                 addr="alice@example.org"):
+        from deltachat.message import get_viewtype_code_from_name
+        self.text = text
+        self.chat = FakeChat(group)
+        self.filename = filename
+        self._view_type = get_viewtype_code_from_name(view_type)
+        self.addr = addr
+
+    def get_sender_contact(self):
+        return FakeContact(self.addr)
+
+
+class TestFilterIndex:
+    @pytest.fixture
+    def make_index(self):
+        def make_index(**preconditions):
+            defs = [FilterDef(name, short="", long="", func=None, **kwargs)
+                    for name, kwargs in preconditions.items()]
+            return FilterIndex(defs)
+        return make_index
+
+    def matching(self, index, message):
+        return [filter_def.name for filter_def in index.get_matching(message)]
+
+    def test_no_preconditions(self, make_index):
+        index = make_index(a={}, b={})
+        assert self.matching(index, FakeMessage("hello")) == ["a", "b"]
+
+    def test_chat_type(self, make_index):
+        index = make_index(single=dict(chat_type="single"), group=dict(chat_type="group"),
+                           all={})
+        assert self.matching(index, FakeMessage("x")) == ["single", "all"]
+        assert self.matching(index, FakeMessage("x", group=True)) == ["group", "all"]
+        with pytest.raises(ValueError):
+            make_index(x=dict(chat_type="channel"))
+
+    def test_file_and_view_type(self, make_index):
+        index = make_index(file=dict(has_file=True), nofile=dict(has_file=False),
+                           image=dict(view_type=["image", "gif"]))
+        assert self.matching(index, FakeMessage("x")) == ["nofile"]
+        msg = FakeMessage("x", filename="/x.gif", view_type="gif")
+        assert self.matching(index, msg) == ["file", "image"]
+
+    def test_senders(self, make_index):
+        index = make_index(bob=dict(senders="Bob@example.org"))
+        assert self.matching(index, FakeMessage("x")) == []
+        assert self.matching(index, FakeMessage("x", addr="bob@example.org")) == ["bob"]
+
+    def test_regex_combined(self, make_index):
+        index = make_index(url=dict(regex=r"https?://"), num=dict(regex=re.compile(r"^\d+$")),
+                           upper=dict(regex=re.compile("HELLO", re.IGNORECASE)),
+                           multi=dict(regex=re.compile(r"^end$", re.MULTILINE)))
+        assert index._combined is not None
+        assert self.matching(index, FakeMessage("see https://x hello")) == ["url", "upper"]
+        assert self.matching(index, FakeMessage("42")) == ["num"]
+        assert self.matching(index, FakeMessage("a\nend\nb")) == ["multi"]
+        assert self.matching(index, FakeMessage("")) == []
+
+    def test_priority_order(self, make_index):
+        index = make_index(low=dict(priority=-1), a={}, high=dict(priority=10),
+                           b=dict(chat_type="single"))
+        assert self.matching(index, FakeMessage("x")) == ["high", "a", "b", "low"]
+
+    def test_regex_not_combinable(self, make_index):
+        index = make_index(a=dict(regex=r"(?P<x>a)"), b=dict(regex=r"(?P<x>b)"))
+        assert index._combined is None
+        assert self.matching(index, FakeMessage("b")) == ["b"]
+
+    def test_regex_groups_searched_separately(self, make_index):
+        index = make_index(backref=dict(regex=r"(a)\1"), group=dict(regex=r"(\d+)$"),
+                           flags=dict(regex=r"(?i)hello"), plain=dict(regex="x"))
+        assert index._group_names == {"plain": "_filter0"}
+        assert self.matching(index, FakeMessage("aa")) == ["backref"]
+        assert self.matching(index, FakeMessage("HELLO x 42")) == ["group", "flags", "plain"]
+        assert self.matching(index, FakeMessage("a")) == []
+
+
+def test_register_preconditions(mock_bot, mocker):
+    l = []
+
+    def group_url(message, replies):
+        """ collect urls in groups. """
+        l.append(message.text)
+
+    mock_bot.filters.register(name="group_url", func=group_url, chat_type="group",
+                              regex="https://")
+    for text, group in [("https://a", False), ("hello", True), ("https://b", True)]:
+        msg = mocker.make_incoming_message(text, group=group)
+        replies = Replies(msg, mock_bot.logger)
+        mock_bot.filters.deltabot_incoming_message(message=msg, replies=replies)
+    assert l == ["https://b"]
+    mock_bot.filters.unregister("group_url")
+    assert list(mock_bot.filters.get_index().get_matching(msg)) == []
+
+
+def test_filter_stops_chain(mock_bot, mocker):
+    l = []
+
+    def classify(message, replies):
+        """ handle greetings right away. """
+        l.append("classify")
+        if message.text == "hi":
+            replies.add(text="hello")
+            return True
+
+    def expensive(message, replies):
+        """ expensive processing. """
+        l.append("expensive")
+
+    mock_bot.filters.register(name="expensive", func=expensive)
+    mock_bot.filters.register(name="classify", func=classify, priority=10)
+    for text in ("hi", "something else"):
+        msg = mocker.make_incoming_message(text)
+        replies = Replies(msg, mock_bot.logger)
+        mock_bot.filters.deltabot_incoming_message(message=msg, replies=replies)
+    assert l == ["classify", "classify", "expensive"]
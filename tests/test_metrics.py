@@ -0,0 +1,29 @@
+from urllib.request import urlopen
+from urllib.error import HTTPError
+
+import pytest
+
+from deltabot.metrics import MetricsServer, format_metrics
+
+
+def test_format_metrics(mocker):
+    mocker.run_command("/help")
+    mocker.bot.stats.incr("messages_processed")
+    text = format_metrics(mocker.bot)
+    assert "deltabot_messages_processed_total 1\n" in text
+    assert 'deltabot_queue_depth{queue="incoming"} 0\n' in text
+    assert 'deltabot_queue_capacity{queue="incoming"} 0\n' in text
+    assert 'deltabot_handler_calls_total{kind="command",name="/help"} 1\n' in text
+    assert ('deltabot_handler_latency_seconds_bucket'
+            '{kind="command",name="/help",le="+Inf"} 1\n') in text
+
+
+def test_metrics_server(mock_bot, request):
+    server = MetricsServer(mock_bot, port=0)
+    server.start()
+    request.addfinalizer(server.stop)
+    url = "http://{}:{}".format(*server.address)
+    with urlopen(url + "/metrics") as response:
+        assert b"deltabot_messages_processed_total" in response.read()
+    with pytest.raises(HTTPError):
+        urlopen(url + "/other")
@@ -0,0 +1,56 @@
+from deltabot.bench import make_offline_account
+from deltabot.multi import BotGroup, find_basedirs
+from deltabot.parser import get_base_parser
+from deltabot.plugins import make_plugin_manager
+
+
+def make_basedirs(tmpdir, num):
+    basedirs = []
+    for i in range(num):
+        basedir = tmpdir.mkdir("bot{}".format(i)).strpath
+        make_offline_account(basedir, "bot{}@example.org".format(i)).shutdown()
+        basedirs.append(basedir)
+    return basedirs
+
+
+def test_find_basedirs(tmpdir):
+    basedirs = make_basedirs(tmpdir, 2)
+    tmpdir.mkdir("other")
+    assert find_basedirs(tmpdir.strpath) == basedirs
+
+
+def test_bot_group(tmpdir, request):
+    basedirs = make_basedirs(tmpdir, 2)
+    argv = ["deltabot", "--basedir", tmpdir.strpath]
+    parser = get_base_parser(make_plugin_manager(), argv=argv)
+    args = parser.main_parse_argv(argv + ["serve-many"] + basedirs)
+    group = BotGroup(basedirs, args, logger=None)
+    for bot in group.bots:
+        request.addfinalizer(bot.account.shutdown)
+    bot1, bot2 = group.bots
+
+    assert [bot.basedir for bot in group.bots] == basedirs
+    assert bot1.self_contact.addr == "bot0@example.org"
+    assert bot2.self_contact.addr == "bot1@example.org"
+    # plugin modules are shared, plugin managers and settings are not
+    assert bot1.plugins._pm is not bot2.plugins._pm
+    assert bot1.plugins.dict()[".builtin.db"] is bot2.plugins.dict()[".builtin.db"]
+    bot1.set("hello", "world")
+    assert bot2.get("hello") is None
+
+
+def test_bot_group_shares_threads(tmpdir, request):
+    basedirs = make_basedirs(tmpdir, 2)
+    argv = ["deltabot", "--basedir", tmpdir.strpath]
+    parser = get_base_parser(make_plugin_manager(), argv=argv)
+    args = parser.main_parse_argv(argv + ["serve-many"] + basedirs)
+    group = BotGroup(basedirs, args)
+    for bot in group.bots:
+        request.addfinalizer(bot.account.shutdown)
+    bot1, bot2 = group.bots
+    assert group.logger is bot1.logger
+    assert bot1.async_engine is bot2.async_engine is group.async_engine
+    assert bot1.handler_timeouts._get_executor() is group.handler_executor
+    assert bot2.handler_timeouts._get_executor() is group.handler_executor
+    bot1.handler_timeouts.shutdown()
+    assert bot2.handler_timeouts._get_executor() is group.handler_executor
@@ -1,9 +1,16 @@
 
+import importlib
+import inspect
+import json
+import sys
 from queue import Queue
 
 import pluggy
+import pytest
+
 import deltabot
-from deltabot.plugins import get_global_plugin_manager
+from deltabot.plugins import LazyPlugin, get_global_plugin_manager, make_plugin_manager
+from deltabot.reloader import _call_hook_for
 
 
 def test_globality_plugin_manager(monkeypatch):
@@ -63,3 +70,103 @@ def test_deltabot_init_hooks(monkeypatch, request):
     assert q.get(timeout=10) == 1
     bot.start()
     assert q.get(timeout=10) == 2
+
+
+class TestLazyPlugins:
+    MODULE = """
+from deltabot import deltabot_hookimpl
+
+calls = []
+
+@deltabot_hookimpl(tryfirst=True)
+def deltabot_start(bot):
+    calls.append(bot)
+
+@deltabot_hookimpl(hookwrapper=True)
+def deltabot_shutdown(bot):
+    calls.append("before")
+    yield
+    calls.append("after")
+"""
+
+    @pytest.fixture
+    def entrypoint(self, tmpdir, monkeypatch):
+        # every test needs its own module name, as modules stay in sys.modules
+        modname = "lazymod_{}".format(tmpdir.basename)
+        tmpdir.join(modname + ".py").write(self.MODULE)
+        monkeypatch.syspath_prepend(tmpdir.strpath)
+        monkeypatch.setenv("DELTABOT_PLUGIN_INDEX", tmpdir.join("index.json").strpath)
+
+        class Dist:
+            metadata = dict(name="deltabot-lazy")
+            version = "1.0"
+
+        class EntryPoint:
+            name = "lazy"
+            value = modname
+
+            def load(self):
+                return importlib.import_module(modname)
+
+        ep = EntryPoint()
+        monkeypatch.setattr(deltabot.plugins, "iter_entrypoints", lambda group: [(Dist(), ep)])
+
+        def load_setuptools_entrypoints(self, group, name=None):
+            self.register(ep.load(), name=ep.name)
+
+        monkeypatch.setattr(
+            pluggy.PluginManager,
+            "load_setuptools_entrypoints",
+            load_setuptools_entrypoints
+        )
+        return ep
+
+    def test_index_and_lazy_load(self, entrypoint, tmpdir):
+        pm = make_plugin_manager(lazy=True)
+        assert inspect.ismodule(pm.get_plugin("lazy"))
+        index = json.loads(tmpdir.join("index.json").read())
+        assert sorted(index["plugins"]["lazy"]) == ["deltabot_shutdown", "deltabot_start"]
+        del sys.modules[entrypoint.value]
+
+        pm = make_plugin_manager(lazy=True)
+        lazy = pm.get_plugin("lazy")
+        assert isinstance(lazy, LazyPlugin)
+        assert lazy.plugin is None
+        assert entrypoint.value not in sys.modules
+
+        assert [(plugin, dist.project_name) for plugin, dist in pm.list_plugin_distinfo()] == [
+            (lazy, "deltabot-lazy")]
+
+        _call_hook_for(pm, "deltabot_start", [lazy], bot=1)
+        _call_hook_for(pm, "deltabot_shutdown", [lazy], bot=1)
+        assert lazy.plugin is sys.modules[entrypoint.value]
+        assert lazy.plugin.calls == [1, "before", "after"]
+        # the index still matches the plugin
+        assert tmpdir.join("index.json").exists()
+
+    def test_index_invalidated_on_changed_hooks(self, entrypoint, tmpdir):
+        make_plugin_manager(lazy=True)
+        del sys.modules[entrypoint.value]
+        # the plugin gets a new hook without a new version
+        new_hook = "@deltabot_hookimpl\ndef deltabot_init(bot):\n    pass\n"
+        tmpdir.join(entrypoint.value + ".py").write(self.MODULE + new_hook)
+        pm = make_plugin_manager(lazy=True)
+        with pytest.warns(UserWarning, match="deltabot_init"):
+            _call_hook_for(pm, "deltabot_start", [pm.get_plugin("lazy")], bot=1)
+        assert not tmpdir.join("index.json").exists()
+
+    def test_import_timed(self, entrypoint, monkeypatch):
+        from deltabot.startup import StartupReport
+        monkeypatch.setenv("DELTABOT_PLUGIN_INDEX", "")
+        report = StartupReport()
+        pm = make_plugin_manager(lazy=True, startup_report=report)
+        assert inspect.ismodule(pm.get_plugin("lazy"))
+        assert [(phase, name) for phase, name, seconds in report.timings] == [
+            ("import plugin", "lazy")]
+        assert [dist.project_name for plugin, dist in pm.list_plugin_distinfo()] == [
+            "deltabot-lazy"]
+
+    def test_disabled(self, entrypoint, monkeypatch):
+        monkeypatch.setenv("DELTABOT_PLUGIN_INDEX", "")
+        pm = make_plugin_manager(lazy=True)
+        assert inspect.ismodule(pm.get_plugin("lazy"))
@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+
+def busy_work(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+def test_profile_attributes_plugin(mock_bot):
+    # mock_bot registers this test module as a plugin
+    profiler = mock_bot.profiler
+    profiler.start()
+    with profiler.profile_message():
+        busy_work(0.2)
+    collapsed_path, plugins_path = profiler.stop()
+    with open(plugins_path) as f:
+        lines = f.read().splitlines()
+    assert "profiled messages" in lines[0]
+    assert lines[1].endswith(" " + __name__)
+    with open(collapsed_path) as f:
+        assert "test_profiler.py:busy_work" in f.read()
+
+
+def test_profile_every_nth(mock_bot):
+    profiler = mock_bot.profiler
+    profiler.start(every=2)
+    with pytest.raises(ValueError):
+        profiler.start()
+    for i in range(4):
+        with profiler.profile_message():
+            busy_work(0.02)
+    assert profiler._num_messages == 4
+    profiler.stop()
+    assert not profiler.is_running()
+    assert profiler.stop() == []
+
+
+def test_profile_duration(mock_bot):
+    profiler = mock_bot.profiler
+    profiler.start(duration=0.05)
+    time.sleep(0.5)
+    assert not profiler.is_running()
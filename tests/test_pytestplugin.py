@@ -0,0 +1,36 @@
+import pytest
+
+from deltabot import deltabot_hookimpl
+
+
+@deltabot_hookimpl
+def deltabot_init(bot):
+    bot.commands.register(name="/ping", func=process_command_ping)
+
+
+def process_command_ping(command, replies):
+    """reply with pong. """
+    replies.add(text="pong")
+
+
+class TestBotBench:
+    def test_run_command(self, bot_bench):
+        res = bot_bench.run_command("/ping", rounds=20, p99=10.0, peak_alloc=10 ** 8)
+        assert res.rounds == 20
+        assert res.p50 <= res.p95 <= res.p99 <= res.max
+        assert res.peak_alloc > 0
+        assert "/ping" in str(res)
+
+    def test_process_message(self, bot_bench):
+        res = bot_bench.process_message("hello", group=True, rounds=10, alloc_rounds=0)
+        assert res.rounds == 10
+        assert res.peak_alloc == 0
+
+    def test_budget_exceeded(self, bot_bench):
+        with pytest.raises(pytest.fail.Exception) as excinfo:
+            bot_bench.run_command("/ping", rounds=5, mean=0.0, alloc_rounds=0)
+        assert "exceeds budget: mean=" in str(excinfo.value)
+
+    def test_unknown_budget(self, bot_bench):
+        with pytest.raises(ValueError):
+            bot_bench.measure(lambda: None, rounds=1, p42=1.0)
@@ -0,0 +1,101 @@
+from pytest import approx
+
+from deltabot.bot import CheckAll
+from deltabot.ratelimit import RateLimiter
+
+
+class TestRateLimiter:
+    def test_contact_burst_and_refill(self):
+        limiter = RateLimiter(contact_limit=(2, 10))
+        assert limiter.check(1, 100, now=0) == (0.0, False)
+        assert limiter.check(1, 101, now=0) == (0.0, False)
+        wait, notify = limiter.check(1, 100, now=1)
+        assert wait == approx(4.0) and notify
+        assert limiter.check(1, 100, now=2) == (approx(3.0), False)
+        # other contacts are not limited
+        assert limiter.check(2, 100, now=2) == (0.0, False)
+        assert limiter.check(1, 100, now=5) == (0.0, False)
+        assert limiter.check(1, 100, now=5)[1]
+
+    def test_chat_limit(self):
+        limiter = RateLimiter(contact_limit=(5, 1), chat_limit=(1, 1))
+        assert limiter.check(1, 100, now=0) == (0.0, False)
+        assert limiter.check(2, 100, now=0)[0] == approx(1.0)
+        # no token was taken from the contact bucket
+        assert limiter.check(2, 200, now=0) == (0.0, False)
+
+    def test_dump_load(self):
+        limiter = RateLimiter(contact_limit=(2, 10), chat_limit=(5, 10))
+        limiter.check(1, 100, now=0)
+        limiter.check(1, 100, now=0)
+        limiter.check(2, 100, now=0)
+        items = limiter.dump(now=1)
+        assert dict(items)["contact-1"].split() == ["0.2", "1"]
+        assert len(items) == 3
+
+        limiter = RateLimiter(contact_limit=(2, 10))
+        limiter.load(items + [("contact-3", "invalid")])
+        assert limiter.check(1, 100, now=1)[0] == approx(4.0)
+        assert limiter.check(2, 100, now=1) == (0.0, False)
+
+    def test_lru_bounded(self):
+        limiter = RateLimiter(contact_limit=(1, 10), max_buckets=10)
+        for i in range(100):
+            limiter.check(i, 0, now=0)
+        assert len(limiter._buckets) == 10
+
+
+class TestCheckAllRateLimit:
+    def test_notice_then_drop(self, mock_bot, mocker):
+        mock_bot.rate_limiter = RateLimiter(contact_limit=(1, 60), action="notice")
+        msgs = [mocker.make_incoming_message("hello") for i in range(3)]
+        checkall = CheckAll(mock_bot)
+        for msg in msgs:
+            checkall.process_message(msg)
+        assert mock_bot.stats.get_counter("messages_rate_limited") == 2
+        texts = [m.text for m in msgs[0].chat.get_messages()]
+        assert len([t for t in texts if "too fast" in t]) == 1
+
+    def test_delay(self, mock_bot, mocker, monkeypatch):
+        mock_bot.rate_limiter = RateLimiter(contact_limit=(1, 60), action="delay")
+        delays = []
+        monkeypatch.setattr(mock_bot._eventhandler, "schedule_check", delays.append)
+        checkall = CheckAll(mock_bot)
+        checkall.process_message(mocker.make_incoming_message("hello"))
+        checkall.process_message(mocker.make_incoming_message("hello"))
+        assert delays and 0 < delays[0] <= 60
+
+    def test_admin_exempt(self, mock_bot, mocker):
+        mock_bot.set("admins", "alice@example.org")
+        mock_bot.rate_limiter = RateLimiter(contact_limit=(1, 60), action="drop")
+        checkall = CheckAll(mock_bot)
+        for i in range(3):
+            checkall.process_message(mocker.make_incoming_message("hello"))
+        assert mock_bot.stats.get_counter("messages_rate_limited") == 0
+
+
+def test_serve_shutdown_persists(mock_bot, monkeypatch):
+    import argparse
+    import os
+    from deltabot.builtin.cmdline import Serve
+    from deltabot.builtin.db import DBManager
+
+    class Out:
+        def line(self, msg=""):
+            pass
+
+        def fail(self, msg):
+            raise AssertionError(msg)
+
+    mock_bot.rate_limiter = limiter = RateLimiter(contact_limit=(2, 60), persistent=True)
+    limiter.check(1, 10)
+    monkeypatch.setattr(mock_bot, "is_configured", lambda: True)
+    monkeypatch.setattr(mock_bot, "start", lambda **kwargs: None)
+    monkeypatch.setattr(mock_bot.account, "wait_shutdown", lambda: None)
+    args = argparse.Namespace(workers=0, senders=0, queue_size=10, metrics_port=None,
+                              profile=False, profile_every=1, reload=False,
+                              reload_interval=1.0, startup_report=False)
+    Serve().run(mock_bot, args, Out())
+
+    db = DBManager(os.path.join(mock_bot.basedir, "bot.db"))
+    assert db.deltabot_get_setting("ratelimit/contact-1")
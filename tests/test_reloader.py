@@ -0,0 +1,90 @@
+import os
+import textwrap
+
+import pytest
+
+from deltabot.reloader import ModuleReloader, load_module, reload_module, unload_module
+
+MODULE = """
+from deltabot import deltabot_hookimpl
+
+@deltabot_hookimpl
+def deltabot_init(bot):
+    bot.commands.register(name="/version", func=command_version)
+    bot.filters.register(name="version_filter", func=version_filter)
+    bot.plugins.add_module("version_helper", Helper())
+
+def command_version(command, replies):
+    '''reply with the module version. '''
+    replies.add(text="{version}")
+
+def version_filter(message, replies):
+    '''does nothing. '''
+
+class Helper:
+    @deltabot_hookimpl
+    def deltabot_start(self, bot):
+        bot.set("started", "{version}")
+"""
+
+
+@pytest.fixture
+def module_path(tmpdir, mock_bot):
+    # every test needs its own module name, as modules stay in sys.modules
+    path = tmpdir.mkdir("mods").join("versionmod_{}.py".format(tmpdir.basename))
+
+    def write(version):
+        path.write(textwrap.dedent(MODULE).format(version=version))
+        # make sure the modification time changes
+        stat = os.stat(path.strpath)
+        os.utime(path.strpath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9 * version))
+
+    write(1)
+    write.path = path.strpath
+    mock_bot.set("module-plugins", path.strpath)
+    return write
+
+
+def test_unload_removes_commands_filters_and_plugins(mock_bot, mocker, module_path):
+    load_module(mock_bot, module_path.path)
+    assert mocker.run_command("/version").text == "1"
+    assert "version_helper" in mock_bot.plugins.dict()
+
+    unload_module(mock_bot, module_path.path)
+    assert "/version" not in mock_bot.commands.dict()
+    assert "version_filter" not in mock_bot.filters.dict()
+    assert "version_helper" not in mock_bot.plugins.dict()
+    assert os.path.basename(module_path.path) not in mock_bot.plugins.dict()
+
+
+def test_reload_module(mock_bot, mocker, module_path):
+    load_module(mock_bot, module_path.path)
+    module_path(2)
+    reload_module(mock_bot, module_path.path)
+    assert mocker.run_command("/version").text == "2"
+    assert mock_bot.get("started") == "2"
+
+
+def test_reload_broken_module_keeps_old(mock_bot, mocker, module_path):
+    load_module(mock_bot, module_path.path)
+    with open(module_path.path, "a") as f:
+        f.write("\ndef broken(:\n")
+    with pytest.raises(SyntaxError):
+        reload_module(mock_bot, module_path.path)
+    assert mocker.run_command("/version").text == "1"
+
+
+def test_reloader_check(mock_bot, mocker, module_path):
+    load_module(mock_bot, module_path.path)
+    reloader = ModuleReloader(mock_bot)
+    reloader.start()
+    try:
+        assert reloader.check() == []
+        module_path(3)
+        assert reloader.check() == [module_path.path]
+        assert mocker.run_command("/version").text == "3"
+        mock_bot.set("module-plugins", "")
+        assert reloader.check() == [module_path.path]
+        assert "/version" not in mock_bot.commands.dict()
+    finally:
+        reloader.stop()
@@ -0,0 +1,63 @@
+import time
+
+import pluggy
+
+from deltabot.startup import StartupReport
+
+hookspec = pluggy.HookspecMarker("startuptest")
+hookimpl = pluggy.HookimplMarker("startuptest")
+
+
+class Specs:
+    @hookspec
+    def init(self, arg):
+        pass
+
+
+class Slow:
+    @hookimpl
+    def init(self, arg):
+        time.sleep(0.02)
+        return arg
+
+
+class Wrapper:
+    @hookimpl(hookwrapper=True)
+    def init(self, arg):
+        yield
+
+
+def test_timed_hookimpls():
+    pm = pluggy.PluginManager("startuptest")
+    pm.add_hookspecs(Specs)
+    pm.register(Slow(), name="slow")
+    pm.register(Wrapper(), name="wrapper")
+    report = StartupReport()
+    with report.timed_hookimpls(pm, "init"):
+        assert pm.hook.init(arg=1) == [1]
+    assert [(phase, name) for phase, name, seconds in report.timings] == [("init", "slow")]
+    assert report.timings[0][2] >= 0.02
+
+    # the hookimpls are restored
+    pm.hook.init(arg=2)
+    assert len(report.timings) == 1
+
+
+def test_format_lines():
+    report = StartupReport()
+    report.add("deltabot_init", "fast", 0.001)
+    report.add("deltabot_init", "slow", 0.5)
+    with report.timed("add-module", "mod.py"):
+        pass
+    lines = report.format_lines()
+    assert lines[0].startswith("startup took")
+    assert "slow" in lines[1]
+    assert "fast" in lines[2]
+    assert "mod.py" in lines[3]
+
+
+def test_bot_init_timings(mock_bot):
+    timings = [(phase, name) for phase, name, seconds in mock_bot.startup_report.timings]
+    assert ("deltabot_init_settings", ".builtin.db") in timings
+    assert ("deltabot_init", ".builtin.settings") in timings
+    assert ("DeltaBot.__init__", "") in timings
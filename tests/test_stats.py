@@ -0,0 +1,67 @@
+import pytest
+
+from deltabot import deltabot_hookimpl
+from deltabot.bot import Replies
+from deltabot.stats import Histogram, Stats, format_snapshot, load_snapshot, percentile
+
+
+def test_histogram_quantiles():
+    hist = Histogram()
+    for i in range(98):
+        hist.observe(0.0005)
+    hist.observe(0.2)
+    hist.observe(20)
+    assert hist.count == 100
+    assert hist.quantile(0.5) == 0.001
+    assert hist.quantile(0.99) == 0.25
+    assert hist.quantile(1.0) == float("inf")
+    assert Histogram.from_dict(hist.to_dict()).counts == hist.counts
+
+
+def test_percentile():
+    values = [i / 100.0 for i in range(1, 101)]
+    assert percentile(values, 0.5) == 0.51
+    assert percentile(values, 0.99) == 0.99
+    assert percentile(values, 1.0) == 1.0
+    assert percentile([], 0.5) == 0.0
+
+
+def test_record_and_save(tmpdir):
+    stats = Stats()
+    stats.record("command", "/x", stats.start())
+    stats.record("command", "/x", stats.start(), error=True)
+    path = tmpdir.join("stats.json").strpath
+    stats.save(path)
+    snapshot = load_snapshot(path)
+    lines = format_snapshot(snapshot)
+    assert "command /x: calls=2 errors=1" in lines[1]
+    assert load_snapshot(tmpdir.join("missing").strpath) is None
+
+
+def test_call_hook_per_impl(mock_bot, mocker):
+    class First:
+        @deltabot_hookimpl(tryfirst=True)
+        def deltabot_incoming_message(self, message):
+            pass
+
+    class Failing:
+        @deltabot_hookimpl(tryfirst=True)
+        def deltabot_incoming_message(self, message):
+            raise ValueError()
+
+    mock_bot.plugins.add_module("first", First())
+    msg = mocker.make_incoming_message("/help")
+    hook = mock_bot.plugins.hook.deltabot_incoming_message
+    kwargs = dict(message=msg, bot=mock_bot, replies=Replies(msg, mock_bot.logger))
+    res = mock_bot.stats.call_hook(hook, kwargs)
+    assert res is True
+    names = [name for kind, name, d in mock_bot.stats.snapshot()["handlers"]]
+    assert "deltabot_incoming_message:first" in names
+    assert "deltabot_incoming_message:commands" in names
+    assert "deltabot_incoming_message:filters" not in names
+
+    mock_bot.plugins.add_module("failing", Failing())
+    with pytest.raises(ValueError):
+        mock_bot.stats.call_hook(hook, kwargs)
+    handlers = dict((name, d) for kind, name, d in mock_bot.stats.snapshot()["handlers"])
+    assert handlers["deltabot_incoming_message:failing"]["errors"] == 1
@@ -0,0 +1,72 @@
+import json
+import logging
+import time
+
+from deltabot.supervisor import Supervisor, format_status, shard_basedirs
+
+
+def exit_worker(basedirs, args):
+    pass
+
+
+def sleep_worker(basedirs, args):
+    time.sleep(60)
+
+
+def make_supervisor(basedirs, num_processes, target):
+    return Supervisor(basedirs, args=None, logger=logging.getLogger("test"),
+                      num_processes=num_processes, target=target)
+
+
+def test_shard_basedirs():
+    assert shard_basedirs(["a", "b", "c"], 2) == [["a", "c"], ["b"]]
+    assert shard_basedirs(["a"], 4) == [["a"]]
+
+
+def test_restart_with_backoff():
+    supervisor = make_supervisor(["a", "b", "c"], 2, exit_worker)
+    assert [w.basedirs for w in supervisor.workers] == [["a", "c"], ["b"]]
+    supervisor.start()
+    for worker in supervisor.workers:
+        worker.process.join(30)
+    now = time.time()
+    assert supervisor.check(now) == []
+    assert [w.backoff for w in supervisor.workers] == [2.0, 2.0]
+    restarted = supervisor.check(now + 1.5)
+    assert restarted == supervisor.workers
+    assert [w.restarts for w in supervisor.workers] == [1, 1]
+    supervisor.terminate_workers()
+
+
+def test_terminate_workers():
+    supervisor = make_supervisor(["a"], 1, sleep_worker)
+    supervisor.start()
+    worker = supervisor.workers[0]
+    assert worker.is_alive()
+    supervisor.terminate_workers(timeout=30)
+    assert not worker.is_alive()
+
+
+def test_status(tmpdir):
+    basedirs = [tmpdir.mkdir(name).strpath for name in ("a", "b")]
+
+    def save(basedir, processed, started=1.0):
+        with open(basedir + "/stats.json", "w") as f:
+            json.dump(dict(started=started, time=started, handlers=[],
+                           counters=dict(messages_processed=processed)), f)
+
+    save(basedirs[0], 10)
+    save(basedirs[1], 5)
+    supervisor = make_supervisor(basedirs, 2, exit_worker)
+    status = supervisor.status(now=100.0)
+    assert status["counters"] == dict(messages_processed=15)
+    assert status["rates"] == {}
+    assert [w["alive"] for w in status["workers"]] == [False, False]
+
+    save(basedirs[0], 30)
+    # the second bot restarted and counts from zero again
+    save(basedirs[1], 2, started=50.0)
+    status = supervisor.status(now=110.0)
+    assert status["counters"] == dict(messages_processed=32)
+    assert status["rates"] == dict(messages_processed=2.2)
+    assert "32 processed (2.2/s)" in format_status(status)
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import threading
+
+import pytest
+
+from deltabot.stats import Stats
+from deltabot.timeouts import HandlerTimeout, HandlerTimeouts
+
+
+class FakeReplies:
+    def __init__(self, message, logger):
+        self.incoming_message = message
+        self.logger = logger
+        self.texts = []
+
+    def add(self, text):
+        self.texts.append(text)
+
+    def extend(self, replies):
+        self.texts.extend(replies.texts)
+
+
+class FakeSender:
+    def __init__(self):
+        self.submitted = []
+        self.event = threading.Event()
+
+    def submit(self, replies):
+        self.submitted.append(replies)
+        self.event.set()
+
+
+class FakeBot:
+    def __init__(self):
+        self.logger = logging.getLogger("test-timeouts")
+        self.stats = Stats()
+        self._sender = FakeSender()
+
+
+@pytest.fixture
+def timeouts():
+    timeouts = HandlerTimeouts(FakeBot())
+    yield timeouts
+    timeouts.shutdown()
+
+
+def handler(replies, text, wait=None):
+    if wait is not None:
+        wait.wait(10)
+    replies.add(text)
+    return text
+
+
+def test_no_timeout_calls_directly(timeouts):
+    replies = FakeReplies(None, timeouts.logger)
+    assert timeouts.call(handler, dict(text="hello"), replies, None,
+                         "command", "/x", timeouts.bot.stats.start()) == "hello"
+    assert replies.texts == ["hello"]
+    assert timeouts._executor is None
+
+
+def test_in_time(timeouts):
+    replies = FakeReplies(None, timeouts.logger)
+    timeouts.default = 10
+    assert timeouts.call(handler, dict(text="hello"), replies, None,
+                         "command", "/x", timeouts.bot.stats.start()) == "hello"
+    assert replies.texts == ["hello"]
+
+
+def test_exception_raised(timeouts):
+    def fail(replies):
+        raise TimeoutError("own timeout")
+
+    with pytest.raises(TimeoutError):
+        timeouts.call(fail, {}, FakeReplies(None, timeouts.logger), 10,
+                      "filter", "fail", timeouts.bot.stats.start())
+
+
+def test_timed_out_finishes_late(timeouts):
+    bot = timeouts.bot
+    release = threading.Event()
+    replies = FakeReplies(None, timeouts.logger)
+    with pytest.raises(HandlerTimeout):
+        timeouts.call(handler, dict(text="late", wait=release), replies, 0.01,
+                      "command", "/slow", bot.stats.start())
+    assert replies.texts == [HandlerTimeouts.still_working]
+    assert bot.stats.snapshot()["counters"]["handlers_timed_out"] == 1
+    assert not bot._sender.submitted
+
+    release.set()
+    assert bot._sender.event.wait(10)
+    assert bot._sender.submitted[0].texts == ["late"]
+    assert ("command", "/slow") in dict(
+        ((kind, name), d) for kind, name, d in bot.stats.snapshot()["handlers"])
+
+
+def test_async_cancelled(timeouts):
+    replies = FakeReplies(None, timeouts.logger)
+
+    async def slow():
+        await asyncio.sleep(10)
+
+    with pytest.raises(HandlerTimeout):
+        asyncio.run(timeouts.run_async(slow(), replies, 0.01, "filter", "slow"))
+    assert replies.texts == [HandlerTimeouts.cancelled]
+
+
+def test_async_in_time(timeouts):
+    replies = FakeReplies(None, timeouts.logger)
+
+    async def command_fast(replies):
+        await asyncio.sleep(0)
+        replies.add("fast")
+
+    res = timeouts.call(command_fast, {}, replies, 10, "command", "/fast",
+                        timeouts.bot.stats.start())
+    asyncio.run(timeouts.run_async(res, replies, 10, "command", "/fast"))
+    assert replies.texts == ["fast"]
+    assert timeouts._executor is None
+
+
+def test_shared_executor_not_shut_down():
+    from concurrent.futures import ThreadPoolExecutor
+    executor = ThreadPoolExecutor(2)
+    timeouts = HandlerTimeouts(FakeBot(), executor=executor)
+    replies = FakeReplies(None, timeouts.logger)
+    timeouts.call(handler, dict(text="hello"), replies, 10, "command", "/x",
+                  timeouts.bot.stats.start())
+    timeouts.shutdown()
+    assert timeouts._get_executor() is executor
+    assert executor.submit(int, "1").result() == 1
+    executor.shutdown()
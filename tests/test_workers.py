@@ -0,0 +1,142 @@
+import threading
+import time
+from queue import Full, Queue
+
+import pytest
+
+from deltabot.workers import ChatWorkerPool, PriorityWorkerPool
+
+
+@pytest.fixture
+def pool(mock_bot, request):
+    pool = ChatWorkerPool(3, logger=mock_bot.logger)
+    pool.start()
+    request.addfinalizer(pool.stop)
+    return pool
+
+
+def test_invalid_num_workers(mock_bot):
+    with pytest.raises(ValueError):
+        ChatWorkerPool(0, logger=mock_bot.logger)
+
+
+def test_per_chat_ordering(pool):
+    q = Queue()
+
+    def work(chat_id, num):
+        if num == 0:
+            time.sleep(0.1)
+        q.put((chat_id, num))
+
+    for chat_id in (10, 11, 12):
+        for num in range(5):
+            pool.submit(chat_id, work, chat_id, num)
+
+    results = [q.get(timeout=10) for i in range(15)]
+    for chat_id in (10, 11, 12):
+        assert [num for cid, num in results if cid == chat_id] == list(range(5))
+
+
+def test_slow_chat_does_not_block_others(pool):
+    blocker = threading.Event()
+    q = Queue()
+    pool.submit(0, blocker.wait)
+    pool.submit(1, q.put, 1)
+    assert q.get(timeout=10) == 1
+    blocker.set()
+
+
+def test_tuple_chat_keys(pool):
+    q = Queue()
+    for bot in ("bot1", "bot2"):
+        for num in range(3):
+            pool.submit((bot, 10), q.put, (bot, num))
+    results = [q.get(timeout=10) for i in range(6)]
+    for bot in ("bot1", "bot2"):
+        assert [num for b, num in results if b == bot] == list(range(3))
+
+
+def test_pending_ident_not_resubmitted(pool):
+    blocker = threading.Event()
+    assert pool.submit(5, blocker.wait, ident=42)
+    assert not pool.submit(5, blocker.wait, ident=42)
+    blocker.set()
+    q = Queue()
+    pool.submit(5, q.put, 1)
+    assert q.get(timeout=10) == 1
+    assert pool.submit(5, q.put, 2, ident=42)
+    assert q.get(timeout=10) == 2
+
+
+class TestPriorityWorkerPool:
+    @pytest.fixture
+    def make_pool(self, mock_bot, request):
+        def make_pool(num_workers, maxsize=0):
+            pool = PriorityWorkerPool(num_workers, logger=mock_bot.logger, maxsize=maxsize)
+            pool.start()
+            request.addfinalizer(pool.stop)
+            return pool
+        return make_pool
+
+    def test_priority_order(self, make_pool):
+        pool = make_pool(1)
+        blocker = threading.Event()
+        q = Queue()
+        pool.submit(0, blocker.wait)
+        while pool.qsize():
+            time.sleep(0.01)
+        for chat_id, priority in [(1, 3), (2, 1), (3, 2), (4, 0), (5, 1)]:
+            pool.submit(chat_id, q.put, chat_id, priority=priority)
+        assert pool.qsize() == 5
+        blocker.set()
+        assert [q.get(timeout=10) for i in range(5)] == [4, 2, 5, 3, 1]
+
+    def test_chat_order_and_serialized(self, make_pool):
+        pool = make_pool(3)
+        running = set()
+        q = Queue()
+
+        def work(chat_id, num):
+            assert chat_id not in running
+            running.add(chat_id)
+            time.sleep(0.01)
+            running.discard(chat_id)
+            q.put((chat_id, num))
+
+        for num in range(5):
+            for chat_id in (10, 11):
+                # the priority of a chat's oldest waiting item counts
+                pool.submit(chat_id, work, chat_id, num, priority=5 - num)
+
+        results = [q.get(timeout=10) for i in range(10)]
+        for chat_id in (10, 11):
+            assert [num for cid, num in results if cid == chat_id] == list(range(5))
+
+    def test_bounded(self, make_pool):
+        pool = make_pool(1, maxsize=2)
+        blocker = threading.Event()
+        pool.submit(0, blocker.wait)
+        while pool.qsize():
+            time.sleep(0.01)
+        pool.submit(1, time.sleep, 0)
+        pool.submit(2, time.sleep, 0)
+        with pytest.raises(Full):
+            pool.submit(3, time.sleep, 0, block=False)
+        with pytest.raises(Full):
+            pool.submit(3, time.sleep, 0, timeout=0.05)
+        assert not pool.wait_for_space(timeout=0.05)
+        blocker.set()
+        assert pool.wait_for_space(timeout=10)
+        assert pool.submit(3, time.sleep, 0, timeout=10)
+
+    def test_pending_ident_not_resubmitted(self, make_pool):
+        pool = make_pool(2)
+        blocker = threading.Event()
+        assert pool.submit(5, blocker.wait, ident=42)
+        assert not pool.submit(6, blocker.wait, ident=42)
+        blocker.set()
+        q = Queue()
+        pool.submit(5, q.put, 1)
+        assert q.get(timeout=10) == 1
+        assert pool.submit(5, q.put, 2, ident=42)
+        assert q.get(timeout=10) == 2